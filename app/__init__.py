@@ -1,25 +1,55 @@
-import os
+from collections.abc import Mapping
 from flask import Flask
-from config import Config
+from config import Config, engine_options
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 
-app = Flask(__name__)
-app.config.from_object(Config)  # Ensure this is loaded before accessing config variables
+db = SQLAlchemy()
+login = LoginManager()
+login.login_view = "login"
 
-# Set UPLOAD_FOLDER after app.config is loaded
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'images', 'avatars')
 
-# Make sure the folder exists
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
+def create_app(config=Config):
+    """Build and configure the application.
 
-app.config['MAX_CONTENT_LENGTH'] = 1 * 1024 * 1024  # 1MB max file size
+    ``config`` is a config class or object, or a dict of settings applied on top
+    of Config, e.g. create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://"}).
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login = LoginManager(app)
-login.login_view = "login"
+    Models, views and commands are imported here rather than with the package,
+    and heavy optional modules (alembic, numpy, PIL, pydenticon) are only
+    imported by the code paths that use them.
+    """
+    app = Flask(__name__)
+    if isinstance(config, Mapping):
+        app.config.from_object(Config)
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(config['SQLALCHEMY_DATABASE_URI'])
+    else:
+        app.config.from_object(config)
+
+    db.init_app(app)
+    login.init_app(app)
+
+    from app import (
+        database, models, sessions, passwords, quiz_content, answer_writer, analytics, uploads,
+        routes, cli, queries, instrumentation, search, page_cache,
+    )
+
+    with app.app_context():
+        database.configure_engine(db.engine, app.config)
+        instrumentation.init_app(app, db.engine)
+
+    # Module-level caches and worker pools are shared by the process and take
+    # their sizes from the most recently created app
+    passwords.init_app(app)
+    sessions.init_app(app)
+    quiz_content.init_app(app)
+    analytics.init_app(app)
+    uploads.init_app(app)
+    answer_writer.answer_writer.init_app(app)
 
-from app import models, routes
+    queries.install_lazy_load_guard(app, app.config['LAZY_LOAD_GUARD'] or ('warn' if app.debug else None))
+    routes.init_app(app)
+    cli.init_app(app)
+    return app
@@ -0,0 +1,188 @@
+import threading
+from collections import defaultdict
+import sqlalchemy as sa
+from app import db
+from app.models import QuizAttempt, QuizAttemptQuestion, QuizQuestion, QuizQuestionUserAnswers, TestResult
+from app.cache import LRUCache
+from app.quiz_content import get_quiz_content
+
+OPTIONS = 4
+GROUP_FRACTION = 0.27  # Share of candidates in the upper and lower groups of the discrimination index
+
+_reports = LRUCache(32 * 1024 * 1024)
+_writes = defaultdict(int)  # quiz id -> answer writes seen by this process
+_writes_lock = threading.Lock()
+
+
+def init_app(app):
+    _reports.max_bytes = app.config.get('ANALYTICS_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+
+
+def answers_changed(quiz_ids=(), question_ids=()):
+    """Note that answers to these quizzes (or questions) were written, so their reports are rebuilt.
+
+    An upsert that changes an existing answer leaves the counts and ids of
+    _answers_version as they were, so the answer write paths call this too.
+    """
+    quiz_ids = set(quiz_ids)
+    if question_ids:
+        quiz_ids.update(db.session.scalars(
+            sa.select(QuizQuestion.quiz_id).where(QuizQuestion.id.in_(set(question_ids))).distinct()
+        ))
+    with _writes_lock:
+        for quiz_id in quiz_ids:
+            _writes[quiz_id] += 1
+
+
+def _answers_version(quiz_id):
+    # Changes whenever answers or results are added for the quiz; answers_changed
+    # covers answers changed in place
+    answers = (
+        sa.select(sa.func.count(QuizQuestionUserAnswers.id), sa.func.max(QuizQuestionUserAnswers.id))
+        .join(QuizQuestion, QuizQuestion.id == QuizQuestionUserAnswers.question_id)
+        .where(QuizQuestion.quiz_id == quiz_id)
+    )
+    last_result = sa.select(sa.func.max(TestResult.id)).where(TestResult.quiz_id == quiz_id).scalar_subquery()
+    return (_writes[quiz_id],) + tuple(db.session.execute(answers.add_columns(last_result)).one())
+
+
+def load_responses(quiz_id, question_ids):
+    """Return (user ids, responses) where responses is a users x questions int8 matrix.
+
+    Cells hold the chosen option (1-4) or 0 when the question was not answered.
+    """
+    import numpy as np  # Only analytics needs numpy, so it stays out of startup
+    rows = db.session.execute(
+        sa.select(QuizQuestionUserAnswers.author_id, QuizQuestionUserAnswers.question_id, QuizQuestionUserAnswers.answer)
+        .join(QuizQuestion, QuizQuestion.id == QuizQuestionUserAnswers.question_id)
+        .where(QuizQuestion.quiz_id == quiz_id)
+    ).all()
+    if not rows or not question_ids:
+        return np.empty(0, dtype=np.int64), np.zeros((0, len(question_ids)), dtype=np.int8)
+
+    data = np.array([(author_id, question_id, answer or 0) for author_id, question_id, answer in rows], dtype=np.int64)
+    user_ids, user_index = np.unique(data[:, 0], return_inverse=True)
+    question_lookup = np.asarray(question_ids, dtype=np.int64)
+    order = np.argsort(question_lookup)
+    positions = np.searchsorted(question_lookup, data[:, 1], sorter=order).clip(max=len(order) - 1)
+    question_index = order[positions]
+    known = question_lookup[question_index] == data[:, 1]
+
+    answers = data[:, 2]
+    answers[(answers < 0) | (answers > OPTIONS)] = 0
+    responses = np.zeros((len(user_ids), len(question_ids)), dtype=np.int8)
+    responses[user_index[known], question_index[known]] = answers[known]
+    return user_ids, responses
+
+
+def load_exposure(quiz_id, user_ids, question_ids, responses):
+    """Return a users x questions bool matrix of the questions each candidate was shown.
+
+    Candidates of a sampled quiz only see the questions drawn for their
+    attempts; anyone with an attempt that served the whole quiz, or with no
+    attempt on record, saw every question. An answer always counts as shown.
+    """
+    exposed = responses > 0
+    if not len(user_ids):
+        return exposed
+    attempts = sa.select(QuizAttempt.id, QuizAttempt.user_id).where(QuizAttempt.quiz_id == quiz_id).subquery()
+    rows = db.session.execute(
+        sa.select(attempts.c.user_id, QuizAttemptQuestion.question_id)
+        .select_from(attempts)
+        .outerjoin(QuizAttemptQuestion, QuizAttemptQuestion.attempt_id == attempts.c.id)
+    ).all()
+    drawn = defaultdict(set)
+    whole_quiz = set(user_ids.tolist()) - {user_id for user_id, _ in rows}
+    for user_id, question_id in rows:
+        if question_id is None:
+            whole_quiz.add(user_id)
+        else:
+            drawn[user_id].add(question_id)
+    column = {question_id: j for j, question_id in enumerate(question_ids)}
+    for i, user_id in enumerate(user_ids.tolist()):
+        if user_id in whole_quiz:
+            exposed[i, :] = True
+        else:
+            exposed[i, [column[question_id] for question_id in drawn[user_id] if question_id in column]] = True
+    return exposed
+
+
+def item_statistics(responses, key, exposed=None):
+    """Compute vectorized item statistics from a response matrix and the answer key.
+
+    ``exposed`` marks the questions each candidate was shown (all of them by
+    default); p-values and the discrimination index only count those.
+    """
+    import numpy as np
+    n_users, n_questions = responses.shape
+    if exposed is None:
+        exposed = np.ones(responses.shape, dtype=bool)
+    correct = (responses == key[np.newaxis, :]) & (key > 0)[np.newaxis, :]
+    totals = correct.sum(axis=1)
+    shown = exposed.sum(axis=0)
+
+    def share(rows, mask):
+        # Share of correct answers per question among the candidates shown it
+        seen = mask.sum(axis=0)
+        return np.divide(rows.sum(axis=0), seen, out=np.zeros(n_questions), where=seen > 0)
+
+    p_values = share(correct, exposed)
+
+    # Upper-lower discrimination index over the top and bottom 27%, ranked by
+    # the share of their questions answered correctly
+    group = max(int(round(n_users * GROUP_FRACTION)), 1) if n_users else 0
+    if n_users >= 2:
+        ranking = totals / np.maximum(exposed.sum(axis=1), 1)
+        ranked = np.argsort(ranking, kind="stable")
+        lower, upper = ranked[:group], ranked[-group:]
+        discrimination = share(correct[upper], exposed[upper]) - share(correct[lower], exposed[lower])
+    else:
+        discrimination = np.zeros(n_questions)
+
+    # Option counts per question: column 0 counts unanswered, columns 1-4 the options;
+    # questions a candidate wasn't shown don't count as unanswered
+    flat = (np.arange(n_questions)[np.newaxis, :] * (OPTIONS + 1) + responses).ravel()
+    option_counts = np.bincount(flat, minlength=n_questions * (OPTIONS + 1)).reshape(n_questions, OPTIONS + 1)
+    option_counts[:, 0] -= n_users - shown
+
+    return {
+        "candidates": int(n_users),
+        "shown": shown.tolist(),
+        "p_values": p_values.round(4).tolist(),
+        "discrimination": discrimination.round(4).tolist(),
+        "option_counts": option_counts.tolist(),
+        "score_distribution": np.bincount(totals, minlength=n_questions + 1).tolist(),
+        "mean_score": float(totals.mean()) if n_users else 0.0,
+        "median_score": float(np.median(totals)) if n_users else 0.0,
+        "score_std": float(totals.std()) if n_users else 0.0,
+    }
+
+
+def _build_report(quiz_id, content):
+    import numpy as np
+    questions = content["questions"]
+    question_ids = [question["id"] for question in questions]
+    key = np.array([question["answer"] or 0 for question in questions], dtype=np.int8)
+    user_ids, responses = load_responses(quiz_id, question_ids)
+    exposed = load_exposure(quiz_id, user_ids, question_ids, responses)
+    report = item_statistics(responses, key, exposed)
+    report["quiz_id"] = quiz_id
+    report["questions"] = [
+        {"id": question["id"], "question": question["question"], "answer": question["answer"]}
+        for question in questions
+    ]
+    return report
+
+
+def quiz_report(quiz_id):
+    """Return the analytics report of a quiz, recomputed only after new answers arrive."""
+    content = get_quiz_content(quiz_id)
+    if content is None:
+        return None
+    version = (len(content["questions"]),) + _answers_version(quiz_id)
+    cached = _reports.get(quiz_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    report = _build_report(quiz_id, content)
+    _reports.set(quiz_id, (version, report))
+    return report
@@ -0,0 +1,176 @@
+import atexit
+import threading
+import time
+import sqlalchemy as sa
+from app import db
+from app.models import QuizQuestionUserAnswers
+from app import analytics
+
+
+class AnswerWriter:
+    """Buffers answer upserts in memory and writes them to the database in batches.
+
+    Answers are coalesced per (author, question), so only the latest answer is
+    written. A background thread flushes the buffer when it holds ``batch_size``
+    answers or every ``flush_interval`` seconds. When the buffer reaches
+    ``max_pending`` the submitting request flushes it itself, which bounds memory
+    and pushes back on writers. The buffer is per process: ``flush`` must be
+    called before reading answers back for scoring.
+    """
+
+    UPSERT_CHUNK = 500  # Rows per statement, keeping bound parameters under SQLite's limit
+
+    def __init__(self, batch_size=200, flush_interval=0.5, max_pending=5000, app=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.app = app  # Flushes run in its app context
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('ANSWER_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('ANSWER_FLUSH_INTERVAL', 0.5)
+        self.max_pending = app.config.get('ANSWER_MAX_PENDING', 5000)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="answer-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("Flushing buffered answers failed")
+
+    def submit(self, author_id, question_id, answer, frozen=False):
+        key = (author_id, question_id)
+        with self._lock:
+            previous = self._pending.get(key)
+            self._pending[key] = {
+                "author_id": author_id,
+                "question_id": question_id,
+                "answer": answer,
+                "frozen": bool(frozen or (previous and previous["frozen"])),
+            }
+            depth = len(self._pending)
+
+        if depth >= self.max_pending:
+            self.flush()
+            return
+        self._start()
+        if depth >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self, author_id, question_id):
+        """Return the buffered answer for a question, if it has not been written yet."""
+        with self._lock:
+            return self._pending.get((author_id, question_id))
+
+    def flush(self):
+        """Write every buffered answer, returning once they are committed."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            with self.app.app_context():
+                try:
+                    self._write(list(batch.values()))
+                except Exception:
+                    # Put the batch back unless newer answers for the same questions arrived meanwhile
+                    with self._lock:
+                        for key, entry in batch.items():
+                            self._pending.setdefault(key, entry)
+                    raise
+                elapsed = time.perf_counter() - start
+                analytics.answers_changed(question_ids={entry["question_id"] for entry in batch.values()})
+
+            self.flushes += 1
+            self.rows_written += len(batch)
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.total_flush_seconds += elapsed
+            return len(batch)
+
+    def _write(self, entries):
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            self._write_portable(entries)
+            return
+
+        # Multi-row INSERT ... ON CONFLICT on the (author_id, question_id) unique index;
+        # a question stays frozen once frozen
+        table = QuizQuestionUserAnswers.__table__
+        for start in range(0, len(entries), self.UPSERT_CHUNK):
+            stmt = insert(table).values(entries[start:start + self.UPSERT_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.author_id, table.c.question_id],
+                set_={
+                    "answer": stmt.excluded.answer,
+                    "frozen": sa.or_(sa.func.coalesce(table.c.frozen, False), stmt.excluded.frozen),
+                },
+            )
+            db.session.execute(stmt)
+        db.session.commit()
+
+    def _write_portable(self, entries):
+        author_ids = {entry["author_id"] for entry in entries}
+        question_ids = {entry["question_id"] for entry in entries}
+        existing = {
+            (record.author_id, record.question_id): record
+            for record in db.session.scalars(sa.select(QuizQuestionUserAnswers).where(
+                QuizQuestionUserAnswers.author_id.in_(author_ids),
+                QuizQuestionUserAnswers.question_id.in_(question_ids)
+            ))
+        }
+
+        inserts = []
+        for entry in entries:
+            record = existing.get((entry["author_id"], entry["question_id"]))
+            if record is None:
+                inserts.append(entry)
+            else:
+                record.answer = entry["answer"]
+                record.frozen = bool(record.frozen or entry["frozen"])
+        if inserts:
+            db.session.execute(sa.insert(QuizQuestionUserAnswers), inserts)
+        db.session.commit()
+
+    def stats(self):
+        with self._lock:
+            depth = len(self._pending)
+        return {
+            "queue_depth": depth,
+            "max_pending": self.max_pending,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+        }
+
+
+answer_writer = AnswerWriter()  # Configured by create_app
+# Don't lose buffered answers when the worker process shuts down
+atexit.register(answer_writer.flush)
@@ -0,0 +1,106 @@
+import math
+import time
+import sqlalchemy as sa
+from app import db
+from app.models import QuizQuestion, QuizQuestionUserAnswers
+from app.enums import QuestionAnswerEnum
+from app import analytics
+
+GRACE_SECONDS = 2  # Allowance for network latency and clock drift on client timestamps
+
+
+class AnswerSubmissionError(ValueError):
+    pass
+
+
+def question_time_limit(quiz):
+    # Quiz.duration is the time allowed per question, in minutes
+    return quiz.duration.value * 60
+
+
+def _parse_submission(item):
+    try:
+        question_id = int(item["question_id"])
+        answer = item.get("answer")
+        answer = QuestionAnswerEnum(int(answer)).value if answer not in (None, "") else None
+        started_at = float(item["started_at"])
+        answered_at = float(item["answered_at"])
+    except (KeyError, TypeError, ValueError):
+        raise AnswerSubmissionError(f"Invalid answer entry: {item!r}")
+    # NaN and infinity would slip through every comparison of the time checks
+    if not (math.isfinite(started_at) and math.isfinite(answered_at)):
+        raise AnswerSubmissionError(f"Invalid timestamps in answer entry: {item!r}")
+    return question_id, answer, started_at, answered_at, bool(item.get("frozen"))
+
+
+def save_answers(user_id, quiz, submissions, served_at=None, deadline=None, permutation=None, drawn=None,
+                 question_deadlines=None, now=None):
+    """Upsert a batch of answers for one quiz in a single transaction.
+
+    Each submission carries the question id, the chosen option and the client's
+    ``started_at``/``answered_at`` epoch timestamps. Timestamps are clamped to the
+    window between serving the quiz and now, and answers given after the
+    per-question limit, or once the server-side ``deadline`` of the attempt has
+    passed, freeze the question without being recorded. With the candidate's
+    shuffle.Permutation, answers are displayed option numbers and are stored
+    as the canonical ones. For a sampled attempt, ``drawn`` holds the ids of its
+    questions and answers to any other question are rejected.
+    ``question_deadlines``, given the ids being answered, returns the server-side
+    epoch deadline of each question opened so far (see
+    timing.chained_deadlines): answers to unopened questions are rejected and
+    ones arriving after their question's deadline freeze it, whatever the
+    client's timestamps say.
+    Returns the ids of saved, frozen and rejected questions.
+    """
+    now = time.time() if now is None else now
+    entries = [_parse_submission(item) for item in submissions]
+    limit = question_time_limit(quiz) + GRACE_SECONDS
+
+    question_ids = set(db.session.scalars(
+        sa.select(QuizQuestion.id).where(
+            QuizQuestion.quiz_id == quiz.id,
+            QuizQuestion.id.in_([entry[0] for entry in entries])
+        )
+    ))
+    if drawn is not None:
+        question_ids &= drawn
+    deadlines = question_deadlines(question_ids) if question_deadlines is not None else None
+    existing = {
+        record.question_id: record
+        for record in db.session.scalars(sa.select(QuizQuestionUserAnswers).where(
+            QuizQuestionUserAnswers.author_id == user_id,
+            QuizQuestionUserAnswers.question_id.in_(question_ids)
+        ))
+    }
+
+    result = {"saved": [], "frozen": [], "rejected": []}
+    for question_id, answer, started_at, answered_at, frozen in entries:
+        record = existing.get(question_id)
+        if (question_id not in question_ids or (record is not None and record.frozen)
+                or (deadlines is not None and question_id not in deadlines)):
+            result["rejected"].append(question_id)
+            continue
+
+        if served_at is not None:
+            started_at = max(started_at, served_at)
+        answered_at = min(answered_at, now)
+        late = answered_at < started_at or answered_at - started_at > limit
+        if deadline is not None and now > deadline + GRACE_SECONDS:
+            late = True
+        if deadlines is not None and now > deadlines[question_id] + GRACE_SECONDS:
+            late = True
+
+        if record is None:
+            record = QuizQuestionUserAnswers(question_id=question_id, author_id=user_id)
+            db.session.add(record)
+            existing[question_id] = record
+        if not late:
+            record.answer = permutation.to_canonical(question_id, answer) if permutation else answer
+            result["saved"].append(question_id)
+        if late or frozen:
+            record.frozen = True
+            result["frozen"].append(question_id)
+
+    db.session.commit()
+    analytics.answers_changed(quiz_ids=[quiz.id])
+    return result
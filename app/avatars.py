@@ -0,0 +1,76 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from app.cache import LRUCache
+
+IDENTICON_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'usercontent', 'identicon')
+
+FOREGROUND = [
+    "rgb(45,79,255)",
+    "rgb(254,180,44)",
+    "rgb(226,121,234)",
+    "rgb(30,179,253)",
+    "rgb(232,77,65)",
+    "rgb(49,203,115)",
+    "rgb(141,69,170)"
+]
+BACKGROUND = "rgb(256,256,256)"
+
+_generator = None  # pydenticon pulls in PIL, so it is loaded on the first render
+_rendered = LRUCache(1024 * 1024, sizeof=len)  # Paths known to exist, so repeat lookups skip the filesystem
+
+
+def email_digest(email):
+    # The digest of exactly what the generator renders, so a URL always names one image
+    return hashlib.md5(email.encode('utf-8')).hexdigest()
+
+
+def identicon_filename(digest, size):
+    return f'{digest}-{size}.png'
+
+
+def render_identicon(email, size):
+    global _generator
+    if _generator is None:
+        import pydenticon
+        _generator = pydenticon.Generator(5, 5, digest=hashlib.md5, foreground=FOREGROUND, background=BACKGROUND)
+    return _generator.generate(email, size, size, padding=(8, 8, 8, 8), inverted=False, output_format="png")
+
+
+def ensure_identicon(email, size):
+    """Render the identicon for an email once and return its file path.
+
+    Files are addressed by email digest and size, so every later call is a cache lookup.
+    """
+    path = os.path.join(IDENTICON_DIR, identicon_filename(email_digest(email), size))
+    if _rendered.get(path):
+        return path
+    if not os.path.exists(path):
+        os.makedirs(IDENTICON_DIR, exist_ok=True)
+        # Write to a temporary file first so a concurrent reader never sees a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=IDENTICON_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as pngfile:
+            pngfile.write(render_identicon(email, size))
+        os.replace(tmp_path, path)
+    _rendered.set(path, path)
+    return path
+
+
+def _prerender(args):
+    email, size = args
+    path = os.path.join(IDENTICON_DIR, identicon_filename(email_digest(email), size))
+    if os.path.exists(path):
+        return False
+    ensure_identicon(email, size)
+    return True
+
+
+def prerender_identicons(emails, sizes, workers=None, chunksize=64):
+    """Render missing identicons for every (email, size) pair across a process pool.
+
+    Returns the number of images rendered.
+    """
+    jobs = [(email, size) for email in emails for size in sizes]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(_prerender, jobs, chunksize=chunksize))
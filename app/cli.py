@@ -0,0 +1,108 @@
+import sys
+import click
+from flask.cli import AppGroup
+import sqlalchemy as sa
+from app import db
+from app.models import User
+from app.avatars import prerender_identicons
+from app.question_io import import_questions, export_questions, QuestionImportError, FORMATS
+from app.timing import sweep_abandoned
+from app.search import rebuild as rebuild_search_index
+
+questions_cli = AppGroup('questions', help='Bulk import and export of quiz questions.')
+avatars_cli = AppGroup('avatars', help='Identicon avatar store.')
+attempts_cli = AppGroup('attempts', help='Timed quiz attempts.')
+search_cli = AppGroup('search', help='Full-text search index.')
+
+
+class MigrateCommand(click.Command):
+    """``flask db``, with Flask-Migrate (and alembic) imported only when it runs."""
+
+    def __init__(self, app):
+        super().__init__('db', help='Perform database migrations.')
+        self.app = app
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_cli
+        if 'migrate' not in self.app.extensions:
+            Migrate(self.app, db)
+        # Hand the arguments to Flask-Migrate's own group, options and all
+        return db_cli.make_context(info_name, args, parent=parent, **extra)
+
+
+def init_app(app):
+    app.cli.add_command(MigrateCommand(app))
+    app.cli.add_command(questions_cli)
+    app.cli.add_command(avatars_cli)
+    app.cli.add_command(attempts_cli)
+    app.cli.add_command(search_cli)
+
+
+def _format_for(path, fmt):
+    if fmt:
+        return fmt
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+@questions_cli.command('import')
+@click.argument('quiz_id', type=int)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='File format, guessed from the extension by default.')
+@click.option('--chunk-size', default=500, show_default=True, help='Questions per bulk INSERT.')
+@click.option('--skip-duplicates', is_flag=True, help='Skip questions nearly identical to one already in the bank.')
+def import_command(quiz_id, path, fmt, chunk_size, skip_duplicates):
+    """Import questions from a CSV or JSONL file into QUIZ_ID."""
+    with open(path, newline='', encoding='utf-8') as f:
+        try:
+            result = import_questions(
+                quiz_id, f, _format_for(path, fmt), chunk_size=chunk_size, skip_duplicates=skip_duplicates
+            )
+        except QuestionImportError as e:
+            raise click.ClickException(str(e))
+    click.echo(f'Imported {result.imported} questions into quiz {quiz_id}.')
+    if result.skipped:
+        click.echo(f'Skipped {result.skipped} near-duplicates.')
+
+
+@questions_cli.command('export')
+@click.option('--quiz', 'quiz_id', type=int, help='Export a single quiz.')
+@click.option('--subject', 'subject_id', type=int, help='Export every quiz of a subject.')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv', show_default=True)
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='Output file, stdout by default.')
+def export_command(quiz_id, subject_id, fmt, output):
+    """Export questions of a quiz or a subject as CSV or JSONL."""
+    if (quiz_id is None) == (subject_id is None):
+        raise click.UsageError('Pass exactly one of --quiz or --subject.')
+    out = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        for chunk in export_questions(fmt, quiz_id=quiz_id, subject_id=subject_id):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+
+
+@avatars_cli.command('prerender')
+@click.option('--size', 'sizes', type=int, multiple=True, default=[120], show_default=True, help='Size to render, may be repeated.')
+@click.option('--workers', type=int, help='Worker processes, one per CPU by default.')
+def prerender_command(sizes, workers):
+    """Render missing identicons for every user."""
+    emails = db.session.scalars(sa.select(User.email)).all()
+    rendered = prerender_identicons(emails, sizes, workers=workers)
+    click.echo(f'Rendered {rendered} identicons for {len(emails)} users.')
+
+
+@attempts_cli.command('sweep')
+@click.option('--batch-size', default=200, show_default=True, help='Attempts scored per batch.')
+def sweep_command(batch_size):
+    """Auto-submit quiz attempts whose deadline has passed."""
+    count = sweep_abandoned(batch_size=batch_size)
+    click.echo(f'Auto-submitted {count} attempts.')
+
+
+@search_cli.command('rebuild')
+def rebuild_search_command():
+    """Re-index every subject, topic and question."""
+    count = rebuild_search_index()
+    click.echo(f'Indexed {count} documents.')
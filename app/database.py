@@ -0,0 +1,28 @@
+import sqlalchemy as sa
+
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def configure_engine(engine, config):
+    """Apply per-connection settings that engine options can't express."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    journal_mode = config.get('SQLITE_JOURNAL_MODE', 'WAL').upper()
+    synchronous = config.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    busy_timeout = int(config.get('SQLITE_BUSY_TIMEOUT', 15000))
+    if journal_mode not in JOURNAL_MODES or synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Unsupported SQLite pragmas: journal_mode={journal_mode}, synchronous={synchronous}")
+    in_memory = engine.url.database in (None, "", ":memory:")
+
+    @sa.event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers run alongside the single writer; NORMAL sync is safe with WAL
+        # and avoids an fsync per commit
+        if not in_memory:
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+        cursor.close()
@@ -15,7 +15,7 @@ from wtforms import (
     FieldList,
     FormField
 )
-from wtforms.validators import DataRequired, ValidationError, Email, EqualTo, Length, Optional
+from wtforms.validators import DataRequired, ValidationError, Email, EqualTo, Length, Optional, NumberRange
 from flask_login import current_user
 
 from app import db
@@ -88,6 +88,8 @@ class TopicForm(FlaskForm):
 class QuizForm(FlaskForm):
     duration = SelectField('Question Duration in minutes', choices=[(d.name, d.value) for d in QuestionDurationEnum], validators=[DataRequired()])
     status = SelectField('Select Status', choices=[(s.name, s.value) for s in QuizStatusEnum], validators=[DataRequired()])
+    # Blank serves every question; otherwise each attempt draws this many from the quiz's bank
+    sample_size = IntegerField('Questions per attempt', validators=[Optional(), NumberRange(min=1)])
     submit = SubmitField("Submit")
 
 class QuizQuestionForm(FlaskForm):
@@ -105,9 +107,20 @@ class QuizQuestionForm(FlaskForm):
         (QuestionAnswerEnum.OPTION4.value, "Option 4"),
     ], validators=[DataRequired()])
 
+    # Choices are the subject's topics, set in the view; sampled quizzes draw evenly across them
+    topic = SelectField('Topic', coerce=int, choices=[], validators=[Optional()])
+
     submit = SubmitField('Submit')
 
 class QuizQuestionAnswerForm(FlaskForm):
     answer = RadioField('Select your answer', choices=[], coerce=str, validators=[Optional()])
     frozen = HiddenField()
-    submit = SubmitField('Submit Answer')
\ No newline at end of file
+    submit = SubmitField('Submit Answer')
+
+class SubmitQuizForm(FlaskForm):
+    submit = SubmitField('Submit Quiz')
+
+class QuestionImportForm(FlaskForm):
+    file = FileField('Questions file (CSV or JSONL)', validators=[DataRequired(), FileAllowed(['csv', 'jsonl'], 'CSV or JSONL files only!')])
+    skip_duplicates = BooleanField('Skip near-duplicates of existing questions', default=True)
+    submit = SubmitField('Import')
@@ -0,0 +1,291 @@
+import cProfile
+import heapq
+import os
+import random
+import threading
+import time
+from collections import deque
+from flask import g, request, current_app, has_request_context, before_render_template, template_rendered
+import sqlalchemy as sa
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SLOWEST_STATEMENTS = 5  # Kept per request
+STATEMENT_CHARS = 300
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, (counts, total, count) in series:
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = _labels(self.label_names, label_values, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.label_names, label_values)} {_number(value)}" for label_values, value in values)
+        return lines
+
+
+requests_total = Counter("quizz_requests_total", "Requests handled.", ("endpoint", "method", "status"))
+request_seconds = Histogram("quizz_request_duration_seconds", "Request wall time.", ("endpoint", "method"), DURATION_BUCKETS)
+sql_queries = Histogram("quizz_request_sql_queries", "SQL statements per request.", ("endpoint",), COUNT_BUCKETS)
+sql_seconds = Histogram("quizz_request_sql_duration_seconds", "SQL time per request.", ("endpoint",), DURATION_BUCKETS)
+template_seconds = Histogram("quizz_template_render_seconds", "Template render time.", ("template",), DURATION_BUCKETS)
+form_errors = Counter("quizz_form_errors_total", "Submitted forms that failed validation.", ("endpoint", "field"))
+METRICS = [requests_total, request_seconds, sql_queries, sql_seconds, template_seconds, form_errors]
+
+slow_requests = deque(maxlen=50)  # Most recent requests above SLOW_REQUEST_SECONDS
+
+
+class Profiler:
+    """Opt-in cProfile sampling of requests; slow ones are dumped as .prof files."""
+
+    def __init__(self, enabled, sample_rate, threshold, directory):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.directory = directory
+        self.dumps = 0
+
+    def settings(self):
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "threshold_seconds": self.threshold,
+            "directory": self.directory,
+            "dumps": self.dumps,
+        }
+
+    def maybe_start(self):
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None  # Another profiler is already active on this thread
+        return profile
+
+    def finish(self, profile, elapsed, endpoint):
+        profile.disable()
+        if elapsed < self.threshold:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(
+            self.directory,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(elapsed * 1000)}ms-{threading.get_ident()}.prof"
+        )
+        profile.dump_stats(path)
+        self.dumps += 1
+        return path
+
+
+profiler = None
+
+
+def _endpoint():
+    return request.endpoint or "(unmatched)"
+
+
+def _state():
+    if not has_request_context():
+        return None
+    return g.get('_instrumentation')
+
+
+def init_app(app, engine):
+    """Record per-request timings, SQL statistics and template render times."""
+    global profiler
+    profiler = Profiler(
+        enabled=app.config.get('PROFILE_REQUESTS', False),
+        sample_rate=app.config.get('PROFILE_SAMPLE_RATE', 1.0),
+        threshold=app.config.get('PROFILE_THRESHOLD_SECONDS', 0.5),
+        directory=app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles'),
+    )
+    slow_threshold = app.config.get('SLOW_REQUEST_SECONDS', 1.0)
+
+    @app.before_request
+    def start_request():
+        g._instrumentation = {
+            "start": time.perf_counter(),
+            "sql_count": 0,
+            "sql_time": 0.0,
+            "statements": [],  # Heap of the slowest (duration, statement)
+            "template_time": 0.0,
+            "template_depth": 0,
+            "profile": profiler.maybe_start(),
+        }
+
+    @app.after_request
+    def record_status(response):
+        state = _state()
+        if state is not None:
+            state["status"] = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        state = g.pop('_instrumentation', None)
+        if state is None:
+            return
+        elapsed = time.perf_counter() - state["start"]
+        endpoint = _endpoint()
+        status = state.get("status", 500 if exc is not None else 200)
+        requests_total.inc((endpoint, request.method, str(status)))
+        request_seconds.observe((endpoint, request.method), elapsed)
+        sql_queries.observe((endpoint,), state["sql_count"])
+        sql_seconds.observe((endpoint,), state["sql_time"])
+
+        profile_path = None
+        if state["profile"] is not None:
+            profile_path = profiler.finish(state["profile"], elapsed, endpoint)
+        if elapsed >= slow_threshold:
+            slowest = [
+                {"seconds": round(duration, 6), "statement": statement}
+                for duration, statement in sorted(state["statements"], reverse=True)
+            ]
+            slow_requests.append({
+                "at": time.time(),
+                "endpoint": endpoint,
+                "method": request.method,
+                "path": request.path,
+                "status": status,
+                "seconds": round(elapsed, 6),
+                "sql_count": state["sql_count"],
+                "sql_seconds": round(state["sql_time"], 6),
+                "template_seconds": round(state["template_time"], 6),
+                "slowest_statements": slowest,
+                "profile": profile_path,
+            })
+            app.logger.warning(
+                f"Slow request {request.method} {request.path}: {elapsed:.3f}s, "
+                f"{state['sql_count']} SQL statements in {state['sql_time']:.3f}s"
+            )
+
+    @sa.event.listens_for(engine, "before_cursor_execute")
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+    @sa.event.listens_for(engine, "handle_error")
+    def failed_statement(exception_context):
+        # A failed statement never reaches after_cursor_execute; drop its start time
+        # so later statements on the connection pair up with their own
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('_query_start') and exception_context.statement is not None:
+            conn.info['_query_start'].pop()
+
+    @sa.event.listens_for(engine, "after_cursor_execute")
+    def finish_statement(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['_query_start'].pop()
+        state = _state()
+        if state is None:
+            return
+        state["sql_count"] += 1
+        state["sql_time"] += duration
+        entry = (duration, statement[:STATEMENT_CHARS])
+        if len(state["statements"]) < SLOWEST_STATEMENTS:
+            heapq.heappush(state["statements"], entry)
+        elif duration > state["statements"][0][0]:
+            heapq.heapreplace(state["statements"], entry)
+
+    def template_started(sender, template, context, **extra):
+        state = _state()
+        if state is not None:
+            state["template_depth"] += 1
+            if state["template_depth"] == 1:
+                state["template_start"] = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        state = _state()
+        if state is None or not state["template_depth"]:
+            return
+        state["template_depth"] -= 1
+        if state["template_depth"] == 0:
+            duration = time.perf_counter() - state["template_start"]
+            state["template_time"] += duration
+            template_seconds.observe((template.name or "(string)",), duration)
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+
+def record_form_errors(form):
+    """Count and log the fields of a submitted form that failed validation."""
+    if not form.errors:
+        return
+    endpoint = _endpoint() if has_request_context() else "(none)"
+    for field in form.errors:
+        form_errors.inc((endpoint, field))
+    current_app.logger.info(f"Form errors on {endpoint}: {form.errors}")
+
+
+def render_metrics(gauges=None):
+    """Render every metric in the Prometheus text exposition format.
+
+    ``gauges`` maps a metric name to a number for point-in-time values such as
+    cache and buffer statistics.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
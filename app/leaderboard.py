@@ -0,0 +1,209 @@
+import threading
+from bisect import bisect_left, insort
+import sqlalchemy as sa
+from app import db
+from app.models import Quiz, TestResult
+
+
+class _Counts:
+    """Fenwick tree of entry counts per integer score, growing on demand."""
+
+    def __init__(self, size=64):
+        self.tree = [0] * (size + 1)
+
+    def add(self, score, delta):
+        while score + 1 >= len(self.tree):
+            self._grow()
+        i = score + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def count_upto(self, score):
+        # Number of entries with a score <= score
+        i = min(score + 1, len(self.tree) - 1)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _grow(self):
+        counts = [self.count_upto(i) - self.count_upto(i - 1) for i in range(len(self.tree) - 1)]
+        self.tree = [0] * (2 * len(self.tree) - 1)
+        for score, count in enumerate(counts):
+            if count:
+                self.add(score, count)
+
+
+class Leaderboard:
+    """Ranks one entry per user by score (high first), then time taken (low first).
+
+    "My rank" costs O(log n) and the top K entries cost O(K + distinct scores).
+    """
+
+    def __init__(self):
+        self.entries = {}  # user id -> (score, time taken)
+        self.buckets = {}  # score -> sorted [(time taken, user id)]
+        self.counts = _Counts()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def set(self, user_id, score, time_taken):
+        self.remove(user_id)
+        score = max(int(score), 0)
+        self.entries[user_id] = (score, time_taken)
+        insort(self.buckets.setdefault(score, []), (time_taken, user_id))
+        self.counts.add(score, 1)
+
+    def remove(self, user_id):
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            return
+        score, time_taken = entry
+        bucket = self.buckets[score]
+        del bucket[bisect_left(bucket, (time_taken, user_id))]
+        if not bucket:
+            del self.buckets[score]
+        self.counts.add(score, -1)
+
+    def rank(self, user_id):
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+        score, time_taken = entry
+        higher = len(self.entries) - self.counts.count_upto(score)
+        faster = bisect_left(self.buckets[score], (time_taken,))
+        return higher + faster + 1
+
+    def top(self, k):
+        rows = []
+        for score in sorted(self.buckets, reverse=True):
+            for time_taken, user_id in self.buckets[score]:
+                if len(rows) == k:
+                    return rows
+                rows.append((self.rank(user_id), user_id, score, time_taken))
+        return rows
+
+
+def _better(a, b):
+    # (score, time taken) pairs: a higher score wins, then a shorter time
+    return b is None or (a[0], -a[1]) > (b[0], -b[1])
+
+
+class _Board:
+    def __init__(self):
+        self.leaderboard = Leaderboard()
+        self.best = {}  # (user id, quiz id) -> best (score, time taken)
+        self.last_result_id = 0
+        self.lock = threading.Lock()
+
+    def apply(self, result_id, user_id, quiz_id, score, time_taken, per_quiz_sum):
+        # Applying a result again changes nothing, as only a strictly better one replaces the best
+        self.last_result_id = max(self.last_result_id, result_id)
+        key = (user_id, quiz_id)
+        previous = self.best.get(key)
+        if not _better((score, time_taken), previous):
+            return
+        self.best[key] = (score, time_taken)
+        if not per_quiz_sum:
+            self.leaderboard.set(user_id, score, time_taken)
+            return
+        # Subject boards rank the sum of each user's best result per quiz
+        total_score, total_time = self.leaderboard.entries.get(user_id, (0, 0.0))
+        if previous is not None:
+            total_score -= previous[0]
+            total_time -= previous[1]
+        self.leaderboard.set(user_id, total_score + score, total_time + time_taken)
+
+
+_boards = {}
+_lock = threading.Lock()  # Guards _boards itself; each board has its own lock
+# Result ids are handed out before commit, so on PostgreSQL a result may become
+# visible after one with a higher id. Catching up re-reads this many ids below
+# the board's watermark to pick such results up.
+LOOKBACK_IDS = 100
+
+
+def _results_query(kind, board_id):
+    stmt = sa.select(TestResult.id, TestResult.user_id, TestResult.quiz_id, TestResult.score, TestResult.time_taken)
+    if kind == 'quiz':
+        return stmt.where(TestResult.quiz_id == board_id)
+    return stmt.join(Quiz, Quiz.id == TestResult.quiz_id).where(Quiz.subject_id == board_id)
+
+
+def _catch_up(kind, board_id, board):
+    # Apply results written since this board was last read, including ones
+    # submitted through other worker processes. The query runs without any
+    # lock held; only applying its rows takes the board's lock.
+    since = board.last_result_id - LOOKBACK_IDS if board.last_result_id else 0
+    rows = db.session.execute(
+        _results_query(kind, board_id)
+        .where(TestResult.id > since)
+        .order_by(TestResult.id)
+    ).all()
+    with board.lock:
+        for row in rows:
+            board.apply(*row, per_quiz_sum=kind == 'subject')
+
+
+def _board(kind, board_id):
+    with _lock:
+        board = _boards.get((kind, board_id))
+        if board is None:
+            board = _boards[(kind, board_id)] = _Board()
+        return board
+
+
+def standings(kind, board_id, k=10, user_id=None):
+    """Return the top K rows, the given user's rank and the entry count of a board.
+
+    ``kind`` is 'quiz' or 'subject'. Rows are (rank, user id, score, time taken).
+    """
+    board = _board(kind, board_id)
+    _catch_up(kind, board_id, board)
+    with board.lock:
+        leaderboard = board.leaderboard
+        my_rank = leaderboard.rank(user_id) if user_id is not None else None
+        return leaderboard.top(k), my_rank, len(leaderboard)
+
+
+def record_result(test_result, subject_id):
+    """Bring the loaded boards of a freshly inserted TestResult up to date.
+
+    Boards nobody has read yet are left alone and get built on first access.
+    The result itself is applied even when its id is below the look-back window.
+    """
+    for kind, board_id in (('quiz', test_result.quiz_id), ('subject', subject_id)):
+        with _lock:
+            board = _boards.get((kind, board_id))
+        if board is None:
+            continue
+        _catch_up(kind, board_id, board)
+        with board.lock:
+            board.apply(test_result.id, test_result.user_id, test_result.quiz_id, test_result.score,
+                        test_result.time_taken, per_quiz_sum=kind == 'subject')
+
+
+def rebuild_all():
+    """Rebuild every quiz and subject board from scratch in one pass over TestResult."""
+    boards = {}
+    rows = db.session.execute(
+        sa.select(TestResult.id, TestResult.user_id, TestResult.quiz_id, TestResult.score,
+                  TestResult.time_taken, Quiz.subject_id)
+        .join(Quiz, Quiz.id == TestResult.quiz_id)
+        .order_by(TestResult.id)
+        .execution_options(yield_per=1000)
+    )
+    for result_id, user_id, quiz_id, score, time_taken, subject_id in rows:
+        for kind, board_id in (('quiz', quiz_id), ('subject', subject_id)):
+            board = boards.get((kind, board_id))
+            if board is None:
+                board = boards[(kind, board_id)] = _Board()
+            board.apply(result_id, user_id, quiz_id, score, time_taken, per_quiz_sum=kind == 'subject')
+
+    with _lock:
+        _boards.clear()
+        _boards.update(boards)
+    return len(boards)
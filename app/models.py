@@ -1,4 +1,3 @@
-import os
 from datetime import date
 from datetime import datetime, timezone
 from flask_login import UserMixin
@@ -6,9 +5,10 @@ from app import db
 import sqlalchemy as sa
 import sqlalchemy.orm as so
 from typing import Optional
-import pydenticon, hashlib, base64
-from app import login
-from werkzeug.security import generate_password_hash, check_password_hash
+import base64
+from flask import url_for
+from app import avatars
+from app import passwords
 from app.enums import QuestionDurationEnum, QuizStatusEnum, QuestionAnswerEnum
 
 # User table
@@ -25,36 +25,24 @@ class User(UserMixin, db.Model):
     answers: so.WriteOnlyMapped['QuizQuestionUserAnswers'] = so.relationship(back_populates='author')
     test_results: so.Mapped[list["TestResult"]] = so.relationship("TestResult", back_populates="user")
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.check_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return passwords.needs_rehash(self.password_hash)
     
     def gen_avatar(self, size=36, write_png=True):
-        foreground = [ 
-            "rgb(45,79,255)",
-            "rgb(254,180,44)",
-            "rgb(226,121,234)",
-            "rgb(30,179,253)",
-            "rgb(232,77,65)",
-            "rgb(49,203,115)",
-            "rgb(141,69,170)"
-        ]
-        background = "rgb(256,256,256)"
-
-        digest = hashlib.md5(self.email.lower().encode('utf-8')).hexdigest()
-        basedir = os.path.abspath(os.path.dirname(__file__))
-        pngloc = os.path.join(basedir, 'usercontent', 'identicon', str(digest) + '.png')
-        icongen = pydenticon.Generator(5, 5, digest=hashlib.md5, foreground=foreground, background=background)
-        pngicon = icongen.generate(self.email, size, size, padding=(8, 8, 8, 8), inverted=False, output_format="png")
-        
-        if write_png:
-            if not os.path.exists(os.path.join(basedir, 'usercontent', 'identicon')):
-                os.makedirs(os.path.join(basedir, 'usercontent', 'identicon'))  # Ensure directory exists
-            with open(pngloc, "wb") as pngfile:
-                pngfile.write(pngicon)
-        else:
-            return str(base64.b64encode(pngicon))[2:-1]
+        # Identicons are rendered once per (email digest, size) and reused from disk
+        pngloc = avatars.ensure_identicon(self.email, size)
+        if not write_png:
+            with open(pngloc, "rb") as pngfile:
+                return str(base64.b64encode(pngfile.read()))[2:-1]
+
+    def identicon_url(self, size=120):
+        avatars.ensure_identicon(self.email, size)
+        return url_for('identicon', digest=avatars.email_digest(self.email), size=size)
         
     def __repr__(self):
         return '<User {}>'.format(self.username)
@@ -84,7 +72,7 @@ class Topic(db.Model):
     created_at: so.Mapped[sa.DateTime] = so.mapped_column(sa.DateTime, default=sa.func.now())  # Timestamp when topic is created
     
     # Relationship with Subject (many-to-one)
-    subject_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(Subject.id), nullable=False)
+    subject_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(Subject.id), index=True, nullable=False)
     subject: so.Mapped["Subject"] = so.relationship("Subject", back_populates="topics")
 
     def __repr__(self):
@@ -103,11 +91,19 @@ class Quiz(db.Model):
         nullable=False,
         default=QuizStatusEnum.OPEN
     )
+    # Questions drawn at random for each attempt; None serves every question
+    sample_size: so.Mapped[Optional[int]] = so.mapped_column(sa.Integer, nullable=True)
 
     subject_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(Subject.id), nullable=False)
     quiz_subject: so.Mapped["Subject"] = so.relationship("Subject", back_populates="quizzes")
     questions: so.Mapped[list["QuizQuestion"]] = so.relationship("QuizQuestion", back_populates="quiz")
     test_results: so.Mapped[list["TestResult"]] = so.relationship("TestResult", back_populates="quiz")
+
+    __table_args__ = (
+        sa.Index('ix_quiz_subject_id_status', 'subject_id', 'status'),
+        # A subject's quizzes in id order, for keyset pagination
+        sa.Index('ix_quiz_subject_id_id', 'subject_id', 'id'),
+    )
     
     def __repr__(self):
         return f'<Quiz {self.id}>'
@@ -120,13 +116,19 @@ class QuizQuestion(db.Model):
     option2: so.Mapped[str] = so.mapped_column(sa.Text, nullable=False)
     option3: so.Mapped[str] = so.mapped_column(sa.Text, nullable=False)
     option4: so.Mapped[str] = so.mapped_column(sa.Text, nullable=False)
+    position: so.Mapped[Optional[int]] = so.mapped_column(sa.Integer, nullable=True)  # 1-based order of the question within its quiz
     quiz_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(Quiz.id), nullable=False)
+    topic_id: so.Mapped[Optional[int]] = so.mapped_column(sa.Integer, sa.ForeignKey(Topic.id), nullable=True)  # Stratum for sampled quizzes
     quiz: so.Mapped["Quiz"] = so.relationship("Quiz", back_populates="questions")
     answer: so.Mapped['QuizQuestionAnswer'] = so.relationship("QuizQuestionAnswer", back_populates="question", uselist=False)
     user_answer: so.Mapped['QuizQuestionUserAnswers'] = so.relationship("QuizQuestionUserAnswers", back_populates="question", uselist=False)
     # answers: so.Mapped[list["QuizzQuestionAnsers"]] = so.relationship("QuizzQuestionAnsers", back_populates="question")
     # users_answers: so.Mapped[list["QuizQuestionUserAnswers"]] = so.relationship("QuizQuestionUserAnswers", back_populates="question")
 
+    __table_args__ = (
+        sa.Index('ix_quiz_question_quiz_id_position', 'quiz_id', 'position'),
+    )
+
     def __repr__(self):
         return f"<Question {self.question}>"
 
@@ -147,18 +149,23 @@ class QuizQuestionUserAnswers(db.Model):
     locked: so.Mapped[bool] = so.mapped_column(sa.Boolean, default=False)
     question_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(QuizQuestion.id), index=True, nullable=False)
     question: so.Mapped["QuizQuestion"] = so.relationship("QuizQuestion", back_populates="user_answer")
-    author_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(User.id), index=True, nullable=False)
+    author_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(User.id), nullable=False)
     author: so.Mapped["User"] = so.relationship("User", back_populates="answers")
     frozen: so.Mapped[bool] = so.mapped_column(sa.Boolean, default=False, nullable=True)
 
+    # One answer per user and question; also serves lookups by author
+    __table_args__ = (
+        sa.Index('uq_quiz_question_user_answers_author_id_question_id', 'author_id', 'question_id', unique=True),
+    )
+
     def __repr__(self):
         return f"<Answer {self.answer}>"
 
 # Test Result table to store user results for each quiz
 class TestResult(db.Model):
     id: so.Mapped[int] = so.mapped_column(sa.Integer, primary_key=True)  # Primary key
-    user_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(User.id), nullable=False)
-    quiz_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(Quiz.id), nullable=False)
+    user_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(User.id), index=True, nullable=False)
+    quiz_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(Quiz.id), index=True, nullable=False)
     score: so.Mapped[int] = so.mapped_column(sa.Integer, default=0, nullable=False)  # Score of the user in the quiz
     total_questions: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False)  # Total questions in the quiz
     time_taken: so.Mapped[float] = so.mapped_column(sa.Float, nullable=False)  # Time taken by the user to complete the quiz
@@ -170,8 +177,57 @@ class TestResult(db.Model):
     quiz: so.Mapped[Quiz] = so.relationship("Quiz", back_populates="test_results")
 
     def __repr__(self):
-        return f"<TestResult user={self.user.username} quiz={self.quiz.id} score={self.score}>"
+        return f"<TestResult user={self.user_id} quiz={self.quiz_id} score={self.score}>"
+
+# A candidate's run through a quiz, timed by the server
+class QuizAttempt(db.Model):
+    __tablename__ = 'quiz_attempt'
+
+    id: so.Mapped[int] = so.mapped_column(sa.Integer, primary_key=True)
+    user_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(User.id), nullable=False)
+    quiz_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(Quiz.id), nullable=False)
+    started_at: so.Mapped[datetime] = so.mapped_column(sa.DateTime, nullable=False)  # UTC
+    deadline_at: so.Mapped[datetime] = so.mapped_column(sa.DateTime, nullable=False)  # Latest time the attempt can run to
+    submitted_at: so.Mapped[Optional[datetime]] = so.mapped_column(sa.DateTime, nullable=True)
+    auto_submitted: so.Mapped[bool] = so.mapped_column(sa.Boolean, default=False, nullable=False)
+    test_result_id: so.Mapped[Optional[int]] = so.mapped_column(sa.Integer, sa.ForeignKey(TestResult.id), nullable=True)
+
+    __table_args__ = (
+        sa.Index('ix_quiz_attempt_user_id_quiz_id', 'user_id', 'quiz_id'),
+        sa.Index('ix_quiz_attempt_submitted_at_deadline_at', 'submitted_at', 'deadline_at'),
+    )
+
+    def __repr__(self):
+        return f"<QuizAttempt user={self.user_id} quiz={self.quiz_id}>"
+
+# When each question of an attempt was first served and when its time runs out
+class QuestionTimer(db.Model):
+    __tablename__ = 'question_timer'
+
+    id: so.Mapped[int] = so.mapped_column(sa.Integer, primary_key=True)
+    attempt_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(QuizAttempt.id), nullable=False)
+    question_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(QuizQuestion.id), nullable=False)
+    started_at: so.Mapped[datetime] = so.mapped_column(sa.DateTime, nullable=False)  # UTC
+    deadline_at: so.Mapped[datetime] = so.mapped_column(sa.DateTime, nullable=False)
+
+    __table_args__ = (
+        sa.Index('uq_question_timer_attempt_id_question_id', 'attempt_id', 'question_id', unique=True),
+    )
+
+    def __repr__(self):
+        return f"<QuestionTimer attempt={self.attempt_id} question={self.question_id}>"
+
+# The questions drawn for an attempt at a quiz with a sample_size
+class QuizAttemptQuestion(db.Model):
+    __tablename__ = 'quiz_attempt_question'
+
+    id: so.Mapped[int] = so.mapped_column(sa.Integer, primary_key=True)
+    attempt_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(QuizAttempt.id), nullable=False)
+    question_id: so.Mapped[int] = so.mapped_column(sa.Integer, sa.ForeignKey(QuizQuestion.id), nullable=False)
+
+    __table_args__ = (
+        sa.Index('uq_quiz_attempt_question_attempt_id_question_id', 'attempt_id', 'question_id', unique=True),
+    )
 
-@login.user_loader
-def load_user(id):
-    return db.session.query(User).get(int(id))
\ No newline at end of file
+    def __repr__(self):
+        return f"<QuizAttemptQuestion attempt={self.attempt_id} question={self.question_id}>"
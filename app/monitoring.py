@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+from collections import defaultdict
+import sqlalchemy as sa
+from app import db
+from app.models import QuizAttempt, QuizQuestion, QuizQuestionUserAnswers, TestResult
+
+
+class QuizProgress:
+    """Live progress of one quiz, kept up to date by the answer and submit paths.
+
+    Every watcher of the quiz reads the same snapshot, which is serialized once
+    per change, so the number of viewers doesn't add database or CPU work.
+    """
+
+    def __init__(self, quiz_id, question_ids):
+        self.quiz_id = quiz_id
+        self.question_ids = list(question_ids)
+        self.active = set()  # Users with an attempt in progress
+        self.answered = defaultdict(set)  # question id -> users who answered it
+        self.results = set()  # TestResult ids
+        self.version = 0
+        self._snapshot = (None, None)  # (version, JSON)
+        self._changed = threading.Condition()
+
+    def _bump(self):
+        self.version += 1
+        self._changed.notify_all()
+
+    def start(self, user_id):
+        with self._changed:
+            if user_id not in self.active:
+                self.active.add(user_id)
+                self._bump()
+
+    def answer(self, user_id, question_id):
+        with self._changed:
+            if user_id not in self.answered[question_id]:
+                self.answered[question_id].add(user_id)
+                self._bump()
+
+    def submit(self, user_id, result_id):
+        with self._changed:
+            self.active.discard(user_id)
+            if result_id not in self.results:
+                self.results.add(result_id)
+                self._bump()
+
+    def snapshot(self):
+        with self._changed:
+            version, data = self._snapshot
+            if version == self.version:
+                return data
+            question_ids = self.question_ids + sorted(set(self.answered) - set(self.question_ids))
+            data = json.dumps({
+                "quiz_id": self.quiz_id,
+                "active": len(self.active),
+                "submitted": len(self.results),
+                "questions": [
+                    {"id": question_id, "number": number, "answered": len(self.answered.get(question_id, ()))}
+                    for number, question_id in enumerate(question_ids, start=1)
+                ],
+                "updated_at": time.time(),
+            })
+            self._snapshot = (self.version, data)
+            return data
+
+    def wait(self, version, timeout):
+        """Block until the progress moves past ``version`` or the timeout passes."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+_progress = {}
+_lock = threading.Lock()
+_watchers = 0
+
+
+def _seed(progress):
+    quiz_id = progress.quiz_id
+    active = db.session.scalars(
+        sa.select(QuizAttempt.user_id).where(QuizAttempt.quiz_id == quiz_id, QuizAttempt.submitted_at.is_(None))
+    ).all()
+    answered = db.session.execute(
+        sa.select(QuizQuestionUserAnswers.question_id, QuizQuestionUserAnswers.author_id)
+        .join(QuizQuestion, QuizQuestion.id == QuizQuestionUserAnswers.question_id)
+        .where(QuizQuestion.quiz_id == quiz_id, QuizQuestionUserAnswers.answer.is_not(None))
+    ).all()
+    results = db.session.execute(
+        sa.select(TestResult.user_id, TestResult.id).where(TestResult.quiz_id == quiz_id)
+    ).all()
+    # Events that arrive while seeding are applied too; the sets make both idempotent.
+    # Results go first so users retaking the quiz end up active.
+    for user_id, result_id in results:
+        progress.submit(user_id, result_id)
+    for question_id, user_id in answered:
+        progress.answer(user_id, question_id)
+    for user_id in active:
+        progress.start(user_id)
+
+
+def progress_for(quiz_id, question_ids):
+    """Return the live progress of a quiz, loading it from the database the first time."""
+    with _lock:
+        progress = _progress.get(quiz_id)
+        if progress is not None:
+            return progress
+        # Registered before seeding so no write that happens meanwhile is missed
+        progress = _progress[quiz_id] = QuizProgress(quiz_id, question_ids)
+    try:
+        _seed(progress)
+    except Exception:
+        with _lock:
+            _progress.pop(quiz_id, None)
+        raise
+    return progress
+
+
+# Write-path hooks; quizzes nobody has watched yet are skipped and get loaded
+# from the database on first view
+
+
+def attempt_started(quiz_id, user_id):
+    progress = _progress.get(quiz_id)
+    if progress is not None:
+        progress.start(user_id)
+
+
+def answer_recorded(quiz_id, user_id, question_id):
+    progress = _progress.get(quiz_id)
+    if progress is not None:
+        progress.answer(user_id, question_id)
+
+
+def attempt_submitted(quiz_id, user_id, result_id):
+    progress = _progress.get(quiz_id)
+    if progress is not None:
+        progress.submit(user_id, result_id)
+
+
+def acquire_watcher(limit):
+    global _watchers
+    with _lock:
+        if _watchers >= limit:
+            return False
+        _watchers += 1
+        return True
+
+
+def release_watcher():
+    global _watchers
+    with _lock:
+        _watchers -= 1
+
+
+def event_stream(progress, duration, heartbeat=15, min_interval=1.0):
+    """Yield server-sent events with the quiz's progress whenever it changes.
+
+    Bursts of answers are coalesced to at most one event per ``min_interval``.
+    The stream ends after ``duration`` seconds, and the browser's EventSource
+    reconnects, so an idle tab does not hold a server thread forever.
+    """
+    end = time.monotonic() + duration
+    yield "retry: 3000\n\n"
+    version = None
+    while time.monotonic() < end:
+        current = progress.wait(version, heartbeat)
+        if current == version:
+            yield ": keep-alive\n\n"
+            continue
+        version = current
+        yield f"id: {version}\nevent: progress\ndata: {progress.snapshot()}\n\n"
+        time.sleep(min_interval)
@@ -0,0 +1,91 @@
+import threading
+from app.quiz_content import get_quiz_content
+
+
+class QuizSequence:
+    """Ordered question ids of a quiz with constant-time position lookups."""
+
+    def __init__(self, quiz_id, question_ids, last_position=0):
+        self.quiz_id = quiz_id
+        self.question_ids = list(question_ids)
+        self.index = {question_id: i for i, question_id in enumerate(self.question_ids)}
+        self.last_position = last_position
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def __contains__(self, question_id):
+        return question_id in self.index
+
+    def first(self):
+        return self.question_ids[0] if self.question_ids else None
+
+    def next(self, question_id):
+        i = self.index[question_id] + 1
+        return self.question_ids[i] if i < len(self.question_ids) else None
+
+    def previous(self, question_id):
+        i = self.index[question_id] - 1
+        return self.question_ids[i] if i >= 0 else None
+
+    def number(self, question_id):
+        # 1-based "question k of N" number
+        return self.index[question_id] + 1
+
+    def append(self, question_id, position):
+        self.index[question_id] = len(self.question_ids)
+        self.question_ids.append(question_id)
+        self.last_position = position
+
+
+_sequences = {}
+_lock = threading.Lock()
+
+
+def _build_sequence(quiz_id, question_id=None):
+    content = get_quiz_content(quiz_id, question_id)
+    questions = content["questions"] if content else []
+    last_position = max((question["position"] or 0 for question in questions), default=0)
+    return QuizSequence(quiz_id, [question["id"] for question in questions], last_position)
+
+
+def get_sequence(quiz_id, question_id=None, permutation=None, drawn=None):
+    """Return the cached sequence of a quiz, loading it on first use.
+
+    Passing the question being served rebuilds the sequence when that question
+    is unknown, e.g. when another worker process added it. With a candidate's
+    shuffle.Permutation the questions come in that candidate's order, and with
+    the ``drawn`` ids of a sampled attempt only those questions are included.
+    """
+    sequence = _sequences.get(quiz_id)
+    if sequence is None or (question_id is not None and question_id not in sequence):
+        sequence = _build_sequence(quiz_id, question_id)
+        with _lock:
+            _sequences[quiz_id] = sequence
+    if permutation is None and drawn is None:
+        return sequence
+    # Derived per request rather than cached per candidate; a draw is sorted
+    # by position in O(k log k) instead of filtering the whole bank
+    question_ids = sequence.question_ids
+    if drawn is not None:
+        question_ids = sorted((i for i in drawn if i in sequence), key=sequence.index.__getitem__)
+    if permutation is not None:
+        question_ids = permutation.order(question_ids)
+    return QuizSequence(quiz_id, question_ids, sequence.last_position)
+
+
+def next_position(quiz_id):
+    return get_sequence(quiz_id).last_position + 1
+
+
+def add_question(quiz_id, question_id, position):
+    # Extend the cached sequence in place instead of reloading the whole quiz
+    with _lock:
+        sequence = _sequences.get(quiz_id)
+        if sequence is not None and question_id not in sequence:
+            sequence.append(question_id, position)
+
+
+def invalidate(quiz_id):
+    with _lock:
+        _sequences.pop(quiz_id, None)
@@ -0,0 +1,142 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+import sqlalchemy as sa
+from markupsafe import Markup
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from app import db
+from app.cache import LRUCache
+from app.models import Subject, Topic, Quiz, QuizQuestion, QuizQuestionAnswer
+
+# Content versions. A scope is "subjects" (the subject list), ("subject", id)
+# (a subject, its topics and quizzes) or ("quiz", id) (a quiz and its
+# questions); its version goes up whenever one of those rows changes. The boot
+# nonce makes every version new after a restart, when the counters start over.
+_boot = secrets.token_hex(4)
+_versions = defaultdict(int)
+_lock = threading.Lock()
+_fragments = LRUCache(8 * 1024 * 1024, sizeof=len)
+
+
+def bump(*scopes):
+    with _lock:
+        for scope in scopes:
+            _versions[scope] += 1
+
+
+def version(*scopes):
+    return ".".join([_boot] + [str(_versions[scope]) for scope in scopes])
+
+
+def _scopes_of(connection, obj):
+    if isinstance(obj, Subject):
+        return ["subjects", ("subject", obj.id)]
+    if isinstance(obj, Topic):
+        return [("subject", obj.subject_id)]
+    if isinstance(obj, Quiz):
+        return [("subject", obj.subject_id), ("quiz", obj.id)]
+    if isinstance(obj, QuizQuestion):
+        return [("quiz", obj.quiz_id)]
+    if isinstance(obj, QuizQuestionAnswer):
+        quiz_id = connection.scalar(sa.select(QuizQuestion.quiz_id).where(QuizQuestion.id == obj.question_id))
+        return [("quiz", quiz_id)]
+    return []
+
+
+def _after_flush(session, flush_context):
+    # Every ORM write to the listed models, from any route or command, moves
+    # the versions on once committed; Core bulk writes call bump() themselves.
+    # Bumping at flush would let a concurrent request render the old rows
+    # under the new version and keep them until the next write.
+    changed = [obj for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(
+        obj, (Subject, Topic, Quiz, QuizQuestion, QuizQuestionAnswer)
+    )]
+    if changed:
+        connection = session.connection()
+        session.info.setdefault("page_cache_scopes", set()).update(
+            scope for obj in changed for scope in _scopes_of(connection, obj)
+        )
+
+
+def _after_commit(session):
+    scopes = session.info.pop("page_cache_scopes", None)
+    if scopes:
+        bump(*scopes)
+
+
+def _after_rollback(session):
+    session.info.pop("page_cache_scopes", None)
+
+
+sa.event.listen(db.session, "after_flush", _after_flush)
+sa.event.listen(db.session, "after_commit", _after_commit)
+sa.event.listen(db.session, "after_rollback", _after_rollback)
+
+
+def _role():
+    if current_user.is_anonymous:
+        return "anonymous"
+    return "admin" if current_user.is_admin else "user"
+
+
+def fragment(name, scopes, render):
+    """Return a rendered template fragment, re-rendering it only when its content changes.
+
+    Fragments differ by role (admins get edit buttons, anonymous visitors only
+    see frozen quizzes) and by query string (the page of a listing), but must
+    not contain anything else specific to the user, such as CSRF tokens.
+    """
+    key = f"{name}:{version(*scopes)}:{_role()}:{request.query_string.decode()}"
+    html = _fragments.get(key)
+    if html is None:
+        html = render()
+        _fragments.set(key, html)
+    return Markup(html)
+
+
+def _etag(scopes, forms):
+    parts = [request.endpoint, version(*scopes), request.query_string.decode(), _role()]
+    if not current_user.is_anonymous:
+        # The navigation bar shows the user's name and avatar
+        parts += [current_user.id, current_user.username, current_user.avatar]
+    if forms:
+        # A page kept by the browser must not outlive the CSRF tokens of its forms
+        limit = current_app.config.get('WTF_CSRF_TIME_LIMIT') or 3600
+        parts.append(int(time.time() // (limit / 2)))
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def conditional(scopes, forms=False):
+    """Answer GETs with an ETag derived from content versions, and 304 when it still matches.
+
+    ``scopes`` maps the view's arguments to the scopes the page shows. The
+    browser revalidates every time (no-cache), so a page is never served stale,
+    but an unchanged one costs neither queries nor rendering. Responses that
+    carry flashed messages are left alone.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if request.method != "GET" or session.get("_flashes"):
+                return view(**kwargs)
+            etag = _etag(scopes(**kwargs), forms)
+            if request.if_none_match.contains(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    return {"fragments": len(_fragments), "fragment_bytes": _fragments.bytes, "evictions": _fragments.evictions}
@@ -0,0 +1,99 @@
+import base64
+import json
+import time
+from collections import namedtuple
+import sqlalchemy as sa
+from flask import current_app, request
+from werkzeug.exceptions import BadRequest
+from app import db
+from app.cache import LRUCache
+
+Page = namedtuple("Page", "items per_page next_cursor prev_cursor total")
+_counts = LRUCache(1024 * 1024, sizeof=lambda value: 128)  # SQL and parameters -> (expires at, count)
+
+
+class InvalidCursor(BadRequest):
+    description = "Invalid pagination cursor."
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, list(values)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor, size):
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, values = json.loads(data)
+    except (ValueError, TypeError):
+        raise InvalidCursor()
+    if (direction not in ("after", "before") or not isinstance(values, list) or len(values) != size
+            or not all(isinstance(value, (int, float, str)) for value in values)):
+        raise InvalidCursor()
+    return direction, values
+
+
+def estimate_count(stmt):
+    """Count the rows of a statement, reusing the count for PAGINATION_COUNT_TTL seconds.
+
+    Listings show it as an approximate total, so a page view doesn't cost a
+    COUNT(*) over the whole listing each time.
+    """
+    compiled = stmt.compile(db.engine)
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    now = time.monotonic()
+    cached = _counts.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    count = db.session.scalar(sa.select(sa.func.count()).select_from(stmt.order_by(None).subquery()))
+    _counts.set(key, (now + current_app.config['PAGINATION_COUNT_TTL'], count))
+    return count
+
+
+def paginate(stmt, keys, cursor=None, per_page=None, descending=False, count=False):
+    """Return one page of ``stmt`` ordered by ``keys``, resuming after or before a cursor.
+
+    keys are columns of the selected entity that together identify a row, e.g.
+    (QuizQuestion.position, QuizQuestion.id), so the order is total and a cursor
+    keeps pointing at the same place while rows are added or removed. Each page
+    is a range read on an index over those columns: it costs the same at the
+    end of the listing as at the start. One extra row tells whether there is a
+    page beyond.
+    """
+    config = current_app.config
+    per_page = min(max(per_page or config['PAGE_SIZE'], 1), config['MAX_PAGE_SIZE'])
+    total = estimate_count(stmt) if count else None
+
+    direction, values = decode_cursor(cursor, len(keys)) if cursor else ("after", None)
+    backwards = direction == "before"
+    # Paging backwards reads the same order reversed, then flips the rows back
+    reverse = descending != backwards
+    if values is not None:
+        row_key = sa.tuple_(*keys) if len(keys) > 1 else keys[0]
+        value = sa.tuple_(*values) if len(keys) > 1 else values[0]
+        stmt = stmt.where(row_key < value if reverse else row_key > value)
+    stmt = stmt.order_by(*(key.desc() if reverse else key.asc() for key in keys)).limit(per_page + 1)
+
+    items = db.session.scalars(stmt).all()
+    more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+
+    def cursor_for(direction, item):
+        return encode_cursor(direction, [getattr(item, key.key) for key in keys])
+
+    has_next = more if not backwards else True
+    has_prev = more if backwards else values is not None
+    return Page(
+        items,
+        per_page,
+        cursor_for("after", items[-1]) if items and has_next else None,
+        cursor_for("before", items[0]) if items and has_prev else None,
+        total,
+    )
+
+
+def page_args():
+    # The cursor and per_page query arguments, as keyword arguments for paginate()
+    return {"cursor": request.args.get("cursor"), "per_page": request.args.get("per_page", type=int)}
@@ -0,0 +1,76 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_executor = None
+_slots = None
+_method_prefixes = {}
+
+
+class PasswordHasherBusy(RuntimeError):
+    pass
+
+
+def init_app(app):
+    global _executor, _slots
+    # hashlib's scrypt and pbkdf2 release the GIL, so a thread pool spreads hashes
+    # across cores while capping how many run at once
+    _executor = ThreadPoolExecutor(
+        max_workers=app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1,
+        thread_name_prefix="password",
+    )
+    _slots = threading.BoundedSemaphore(max_in_flight(app.config))
+
+
+def max_in_flight(config):
+    # Every hash in flight holds a server thread while it waits for its result,
+    # so hashes may only ever take part of the pool; the rest keep serving pages
+    threads = config.get('WSGI_THREADS', 16)
+    limit = config.get('PASSWORD_HASH_MAX_IN_FLIGHT') or threads // 2
+    return max(min(limit, threads - 1), 1)
+
+
+def hash_method():
+    return current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+
+def _method_prefix(method):
+    # werkzeug stores fully spelled parameters, e.g. "scrypt" becomes
+    # "scrypt:32768:8:1", so hash once to learn the canonical form
+    prefix = _method_prefixes.get(method)
+    if prefix is None:
+        prefix = _method_prefixes[method] = generate_password_hash("", method=method).split("$", 1)[0]
+    return prefix
+
+
+def _run(func, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy("Too many logins in progress, please try again.")
+    try:
+        return _executor.submit(func, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, hash_method())
+
+
+def check_password(pwhash, password):
+    """Verify a password on the hashing pool.
+
+    At most PASSWORD_HASH_WORKERS hashes run at once and further callers queue.
+    Once PASSWORD_HASH_MAX_IN_FLIGHT checks are in flight (fewer than the
+    server's WSGI_THREADS), a new caller gets PasswordHasherBusy straight away
+    instead of tying up another server thread.
+    """
+    if not pwhash:
+        return False
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """True when a stored hash was made with parameters other than the configured ones."""
+    return bool(pwhash) and pwhash.split("$", 1)[0] != _method_prefix(hash_method())
@@ -0,0 +1,117 @@
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from flask import g, current_app, before_render_template, template_rendered
+from app import db
+from app.pagination import paginate
+from app.models import Subject, Topic, Quiz, QuizQuestion, TestResult
+from app.enums import QuizStatusEnum
+
+# Route-specific loaders. Each one fetches everything its template touches up
+# front, so rendering never goes back to the database.
+
+
+def subjects(cursor=None, per_page=None):
+    return paginate(sa.select(Subject), (Subject.id,), cursor, per_page, count=True)
+
+
+def subject_with_topics(subject_id):
+    return db.session.scalar(
+        sa.select(Subject).options(so.selectinload(Subject.topics)).where(Subject.id == subject_id)
+    )
+
+
+def topic_choices(subject_id):
+    # (id, name) pairs for a select field; 0 stands for "no topic"
+    rows = db.session.execute(
+        sa.select(Topic.id, Topic.name).where(Topic.subject_id == subject_id).order_by(Topic.name)
+    ).all()
+    return [(0, "No topic")] + [tuple(row) for row in rows]
+
+
+def subject_quizzes(subject_id, frozen_only=False, cursor=None, per_page=None):
+    stmt = sa.select(Quiz).where(Quiz.subject_id == subject_id)
+    if frozen_only:
+        stmt = stmt.where(Quiz.status == QuizStatusEnum.FROZEN)
+    return paginate(stmt, (Quiz.id,), cursor, per_page, count=True)
+
+
+def quiz_questions(quiz_id):
+    return db.session.scalars(
+        sa.select(QuizQuestion)
+        .options(so.selectinload(QuizQuestion.answer))
+        .where(QuizQuestion.quiz_id == quiz_id)
+        .order_by(QuizQuestion.position, QuizQuestion.id)
+    ).all()
+
+
+def quiz_question_page(quiz_id, cursor=None, per_page=None):
+    stmt = (
+        sa.select(QuizQuestion)
+        .options(so.selectinload(QuizQuestion.answer))
+        .where(QuizQuestion.quiz_id == quiz_id)
+    )
+    return paginate(stmt, (QuizQuestion.position, QuizQuestion.id), cursor, per_page, count=True)
+
+
+def user_results(user_id, cursor=None, per_page=None):
+    # Newest first; ids grow with completion time and ride on the user_id index
+    stmt = (
+        sa.select(TestResult)
+        .options(so.joinedload(TestResult.quiz).joinedload(Quiz.quiz_subject))
+        .where(TestResult.user_id == user_id)
+    )
+    return paginate(stmt, (TestResult.id,), cursor, per_page, descending=True, count=True)
+
+
+def test_result(test_result_id):
+    return db.session.scalar(
+        sa.select(TestResult)
+        .options(so.joinedload(TestResult.user), so.joinedload(TestResult.quiz))
+        .where(TestResult.id == test_result_id)
+    )
+
+
+class LazyLoadError(RuntimeError):
+    pass
+
+
+def _rendering_started(sender, template, context, **extra):
+    g._rendering_depth = g.get('_rendering_depth', 0) + 1
+
+
+def _rendering_finished(sender, template, context, **extra):
+    g._rendering_depth = max(g.get('_rendering_depth', 0) - 1, 0)
+
+
+def _check_lazy_load(orm_execute_state):
+    if not orm_execute_state.is_relationship_load or not g or not g.get('_rendering_depth'):
+        return
+    mode = current_app.extensions.get('lazy_load_guard')
+    if not mode:
+        return
+    message = f"Lazy load of {orm_execute_state.loader_strategy_path[-1]} while rendering a template"
+    if mode == 'raise':
+        raise LazyLoadError(message)
+    current_app.logger.warning(message)
+
+
+# Registered once on the shared session; each app's mode is looked up per load
+sa.event.listen(db.session, "do_orm_execute", _check_lazy_load)
+
+
+def install_lazy_load_guard(app, mode):
+    """Report relationship loads that fire while a template is rendering.
+
+    ``mode`` is 'raise' to fail the request with LazyLoadError, 'warn' to log
+    it, or None to leave the guard off. Loaders above should cover every
+    relationship a template reads, so any hit is an N+1 regression.
+    benchmarks/query_plans.py renders the hot routes in 'raise' mode.
+    """
+    if not mode:
+        return
+    if mode not in ('raise', 'warn'):
+        raise ValueError(f"Unsupported LAZY_LOAD_GUARD {mode!r}, expected 'raise' or 'warn'")
+
+    app.extensions['lazy_load_guard'] = mode
+    before_render_template.connect(_rendering_started, app)
+    template_rendered.connect(_rendering_finished, app)
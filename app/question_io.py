@@ -0,0 +1,201 @@
+import csv
+import io
+import json
+from collections import namedtuple
+from itertools import islice
+import sqlalchemy as sa
+from app import db
+from app.models import Topic, Quiz, QuizQuestion, QuizQuestionAnswer
+from app.enums import QuestionAnswerEnum
+from app.quiz_content import invalidate_quiz
+from app import navigation
+from app import sampling
+from app import search
+from app import page_cache
+
+FIELDS = ["question", "option1", "option2", "option3", "option4", "answer"]
+EXPORT_FIELDS = ["quiz_id", "position"] + FIELDS + ["topic_id"]
+FORMATS = ("csv", "jsonl")
+
+ImportResult = namedtuple("ImportResult", "imported skipped")
+
+
+class QuestionImportError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) pairs from a text stream without reading it all."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        try:
+            missing = set(FIELDS) - set(reader.fieldnames or [])
+            if missing:
+                raise QuestionImportError(f"CSV header is missing: {', '.join(sorted(missing))}")
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as e:
+            raise QuestionImportError(f"Line {reader.line_num}: malformed CSV ({e})")
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise QuestionImportError(f"Line {line_no}: invalid JSON ({e})")
+            if not isinstance(row, dict):
+                raise QuestionImportError(f"Line {line_no}: expected a JSON object")
+            yield line_no, row
+    else:
+        raise QuestionImportError(f"Unsupported format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+
+def _clean_row(line_no, row, topic_ids):
+    cleaned = {}
+    for field in FIELDS[:-1]:
+        value = row.get(field)
+        if value is None or not str(value).strip():
+            raise QuestionImportError(f"Line {line_no}: '{field}' is required")
+        cleaned[field] = str(value).strip()
+    try:
+        cleaned["answer"] = QuestionAnswerEnum(int(row.get("answer")))
+    except (TypeError, ValueError):
+        raise QuestionImportError(f"Line {line_no}: 'answer' must be 1, 2, 3 or 4")
+    # Optional; blank leaves the question untagged
+    topic_id = row.get("topic_id")
+    try:
+        cleaned["topic_id"] = int(topic_id) if topic_id is not None and str(topic_id).strip() else None
+    except ValueError:
+        raise QuestionImportError(f"Line {line_no}: 'topic_id' must be a topic id")
+    if cleaned["topic_id"] is not None and cleaned["topic_id"] not in topic_ids:
+        raise QuestionImportError(f"Line {line_no}: topic {cleaned['topic_id']} is not a topic of this quiz's subject")
+    return cleaned
+
+
+def import_questions(quiz_id, stream, fmt, chunk_size=500, skip_duplicates=False):
+    """Stream questions into a quiz with chunked bulk inserts in one transaction.
+
+    Each chunk is one multi-row question INSERT returning the new ids in input
+    order, followed by one INSERT of their answers, so ids are assigned in a
+    single pass without per-row round trips. New questions are added to the
+    search index as they go, so with skip_duplicates a question is checked
+    against the whole bank, in any subject, and against earlier chunks of the
+    file. Returns an ImportResult with the numbers added and skipped.
+    """
+    quiz = db.session.get(Quiz, quiz_id)
+    if quiz is None:
+        raise QuestionImportError(f"Quiz {quiz_id} does not exist")
+    topic_ids = set(db.session.scalars(sa.select(Topic.id).where(Topic.subject_id == quiz.subject_id)))
+
+    position = db.session.scalar(
+        sa.select(sa.func.coalesce(sa.func.max(QuizQuestion.position), 0)).where(QuizQuestion.quiz_id == quiz_id)
+    )
+    insert_questions = sa.insert(QuizQuestion).returning(QuizQuestion.id, sort_by_parameter_order=True)
+    rows = read_rows(stream, fmt)
+    imported = skipped = 0
+    seen = set()  # Normalized text of this file's questions, for duplicates within a chunk
+    try:
+        while True:
+            chunk = [_clean_row(line_no, row, topic_ids) for line_no, row in islice(rows, chunk_size)]
+            if not chunk:
+                break
+            if skip_duplicates:
+                kept = []
+                for row in chunk:
+                    text = search.normalize(row["question"])
+                    if text in seen or search.find_duplicates(row["question"]):
+                        skipped += 1
+                    else:
+                        seen.add(text)
+                        kept.append(row)
+                chunk = kept
+                if not chunk:
+                    continue
+            question_rows = []
+            for row in chunk:
+                position += 1
+                question_rows.append({
+                    "question": row["question"],
+                    "option1": row["option1"],
+                    "option2": row["option2"],
+                    "option3": row["option3"],
+                    "option4": row["option4"],
+                    "position": position,
+                    "topic_id": row["topic_id"],
+                    "quiz_id": quiz_id,
+                })
+            question_ids = db.session.scalars(insert_questions, question_rows).all()
+            db.session.execute(sa.insert(QuizQuestionAnswer), [
+                {"question_id": question_id, "option": row["answer"]}
+                for question_id, row in zip(question_ids, chunk)
+            ])
+            search.index_questions([
+                dict(row, id=question_id) for question_id, row in zip(question_ids, question_rows)
+            ])
+            imported += len(chunk)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    invalidate_quiz(quiz_id)
+    navigation.invalidate(quiz_id)
+    sampling.invalidate(quiz_id)
+    # The inserts are Core statements, which the flush hook doesn't see
+    page_cache.bump(("quiz", quiz_id))
+    return ImportResult(imported, skipped)
+
+
+def _export_rows(quiz_ids, batch_size):
+    stmt = (
+        sa.select(
+            QuizQuestion.quiz_id,
+            QuizQuestion.position,
+            QuizQuestion.question,
+            QuizQuestion.option1,
+            QuizQuestion.option2,
+            QuizQuestion.option3,
+            QuizQuestion.option4,
+            QuizQuestionAnswer.option,
+            QuizQuestion.topic_id,
+        )
+        .outerjoin(QuizQuestionAnswer, QuizQuestionAnswer.question_id == QuizQuestion.id)
+        .where(QuizQuestion.quiz_id.in_(quiz_ids))
+        .order_by(QuizQuestion.quiz_id, QuizQuestion.position, QuizQuestion.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in db.session.execute(stmt):
+        values = row._asdict()
+        values["answer"] = values.pop("option").value if values["option"] else None
+        yield values
+
+
+def export_questions(fmt, quiz_id=None, subject_id=None, batch_size=500):
+    """Yield a quiz's or a whole subject's questions as CSV or JSONL text chunks.
+
+    Rows are fetched from a server-side cursor in batches, so memory use does
+    not grow with the number of questions.
+    """
+    if fmt not in FORMATS:
+        raise QuestionImportError(f"Unsupported format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    if quiz_id is not None:
+        quiz_ids = [quiz_id]
+    else:
+        quiz_ids = db.session.scalars(sa.select(Quiz.id).where(Quiz.subject_id == subject_id).order_by(Quiz.id)).all()
+
+    if fmt == "jsonl":
+        for values in _export_rows(quiz_ids, batch_size):
+            yield json.dumps(values) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for values in _export_rows(quiz_ids, batch_size):
+        writer.writerow(values)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
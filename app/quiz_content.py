@@ -0,0 +1,75 @@
+import sqlalchemy as sa
+from app import db
+from app.models import Quiz, QuizQuestion
+from app import queries
+from app.cache import LRUCache, FileSystemBackend, ReadThroughCache
+
+
+def load_quiz_content(quiz_id):
+    """Load a quiz with its ordered questions and answers as plain, cacheable data."""
+    quiz = db.session.get(Quiz, quiz_id)
+    if quiz is None:
+        return None
+
+    questions = queries.quiz_questions(quiz_id)
+    return {
+        "id": quiz.id,
+        "subject_id": quiz.subject_id,
+        "duration": quiz.duration.value,
+        "status": quiz.status.value,
+        "sample_size": quiz.sample_size,
+        "questions": [
+            {
+                "id": question.id,
+                "position": question.position,
+                "topic_id": question.topic_id,
+                "question": question.question,
+                "option1": question.option1,
+                "option2": question.option2,
+                "option3": question.option3,
+                "option4": question.option4,
+                "answer": question.answer.option.value if question.answer else None,
+            }
+            for question in questions
+        ],
+    }
+
+
+quiz_cache = ReadThroughCache(load_quiz_content, LRUCache(16 * 1024 * 1024))
+
+
+def init_app(app):
+    directory = app.config.get('QUIZ_CACHE_SHARED_DIR')
+    quiz_cache.local.max_bytes = app.config.get('QUIZ_CACHE_MAX_BYTES', 16 * 1024 * 1024)
+    quiz_cache.shared = FileSystemBackend(directory, 'quiz_content') if directory else None
+
+
+def find_question(content, question_id):
+    for question in content["questions"]:
+        if question["id"] == question_id:
+            return question
+    return None
+
+
+def get_quiz_content(quiz_id, question_id=None):
+    """Return the cached content of a quiz.
+
+    When the caller needs a particular question that the cached copy lacks,
+    e.g. one just added through another worker, the entry is reloaded once.
+    A primary key lookup first makes sure the question exists, so requests
+    for made-up ids don't throw the entry away for every candidate.
+    """
+    content = quiz_cache.get(quiz_id)
+    if content is not None and question_id is not None and find_question(content, question_id) is None:
+        exists = db.session.scalar(
+            sa.select(QuizQuestion.id).where(QuizQuestion.id == question_id, QuizQuestion.quiz_id == quiz_id)
+        )
+        if exists is None:
+            return content
+        quiz_cache.invalidate(quiz_id)
+        content = quiz_cache.get(quiz_id)
+    return content
+
+
+def invalidate_quiz(quiz_id):
+    quiz_cache.invalidate(quiz_id)
@@ -1,14 +1,17 @@
+import hmac
+import io
+import math
 import os
-import time
 from flask_wtf import FlaskForm  
 from wtforms import StringField, TextAreaField, IntegerField, SelectField, BooleanField, HiddenField, SubmitField  
-from wtforms.validators import DataRequired, Optional  
+from wtforms.validators import DataRequired, Optional, ValidationError
 from urllib.parse import urlsplit
-from flask import Flask, render_template, flash, redirect, url_for, request
+from flask import Flask, render_template, flash, redirect, url_for, request, jsonify, abort, Response, stream_with_context, send_file, current_app
+from flask_wtf.csrf import generate_csrf, validate_csrf
 from flask_login import current_user, login_user, logout_user, login_required
 from werkzeug.utils import secure_filename
 import sqlalchemy as sa
-from app import db, app
+from app import db
 from app.models import (
     User, 
     Subject, 
@@ -16,14 +19,33 @@ from app.models import (
     Quiz, 
     QuizQuestion, 
     QuizQuestionAnswer,
-    QuizQuestionUserAnswers,
-    TestResult
+    QuizQuestionUserAnswers
 ) 
 from app.enums import (
     QuestionDurationEnum, 
     QuizStatusEnum,
     QuestionAnswerEnum
 )
+from app import navigation
+from app import avatars
+from app.uploads import submit_avatar, InvalidImageError
+from app import leaderboard
+from app import queries
+from app import instrumentation
+from app import timing
+from app import monitoring
+from app import shuffle
+from app import sampling
+from app import search
+from app import page_cache
+from app.pagination import page_args
+from app.sessions import invalidate_user
+from app.passwords import PasswordHasherBusy
+from app.analytics import quiz_report
+from app.quiz_content import get_quiz_content, find_question, invalidate_quiz, quiz_cache
+from app.answer_writer import answer_writer
+from app.question_io import import_questions, export_questions, QuestionImportError, FORMATS
+from app.answers import save_answers, question_time_limit, AnswerSubmissionError
 from app.forms import (
     LoginForm, 
     RegistrationForm, 
@@ -32,10 +54,39 @@ from app.forms import (
     TopicForm,
     QuizForm,
     QuizQuestionForm,
-    QuizQuestionAnswerForm
+    QuizQuestionAnswerForm,
+    QuestionImportForm,
+    SubmitQuizForm
 )
 
 
+class Views:
+    """Collects the views below until create_app registers them on the app.
+
+    Unlike a Blueprint it keeps the plain endpoint names the templates pass to url_for.
+    """
+
+    def __init__(self):
+        self.rules = []
+
+    def route(self, rule, **options):
+        def decorator(f):
+            self.rules.append((rule, options.pop('endpoint', None), f, options))
+            return f
+        return decorator
+
+    def init_app(self, app):
+        for rule, endpoint, f, options in self.rules:
+            app.add_url_rule(rule, endpoint, f, **options)
+
+
+views = Views()
+
+
+def init_app(app):
+    views.init_app(app)
+
+
 # TopicForm with added extra fields
 class TopicForm(FlaskForm):
     name = StringField("Topic Name", validators=[DataRequired()])
@@ -49,12 +100,12 @@ class TopicForm(FlaskForm):
     submit = SubmitField("Save")
 
 
-@app.route('/index')
-@app.route('/')
+@views.route('/index')
+@views.route('/')
 def index():
     return render_template("index.html", title="Home")
 
-@app.route("/login", methods=["GET", "POST"])
+@views.route("/login", methods=["GET", "POST"])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for("index"))
@@ -63,7 +114,18 @@ def login():
     if form.validate_on_submit():
         user = db.session.scalar(sa.select(User).where(User.username == form.username.data))
         
-        if user is None or not user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+            if valid and user.password_needs_rehash():
+                # Upgrade hashes made with older parameters while the plain password is at hand
+                user.set_password(form.password.data)
+                db.session.commit()
+        except PasswordHasherBusy as e:
+            # The hashing pool is full and nothing was queued; the browser may retry shortly
+            flash(str(e), "warning")
+            return render_template("login.html", title="Sign In", form=form), 503, {"Retry-After": "1"}
+
+        if not valid:
             flash("Invalid username or password")
             return redirect(url_for("login"))
         
@@ -77,12 +139,12 @@ def login():
     
     return render_template("login.html", title="Sign In", form=form)
 
-@app.route("/logout")
+@views.route("/logout")
 def logout():
     logout_user()
     return redirect(url_for('index'))
 
-@app.route('/register', methods=['GET', 'POST'])
+@views.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -90,7 +152,11 @@ def register():
     form = RegistrationForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data, phone=form.phone.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHasherBusy as e:
+            flash(str(e), "warning")
+            return render_template('register.html', title='Register', form=form), 503, {"Retry-After": "1"}
         db.session.add(user)
         db.session.commit()
         flash('Congratulations, you are now a registered user!')
@@ -98,18 +164,18 @@ def register():
     
     return render_template('register.html', title='Register', form=form)
 
-@app.route('/user/<username>')
+@views.route('/user/<username>')
 @login_required
 def user(username):
     user = db.session.scalar(sa.select(User).where(User.username == username))
     if user is None:
-        app.logger.error(f"User with username {username} not found in the database.")
+        current_app.logger.error(f"User with username {username} not found in the database.")
         flash("User not found.", "danger")
         return redirect(url_for('index')) 
     
     return render_template('user.html', user=user)
 
-@app.route("/user/<username>/edit", methods=["GET", "POST"])
+@views.route("/user/<username>/edit", methods=["GET", "POST"])
 @login_required
 def profile(username):
     user = db.session.scalar(sa.select(User).where(User.username == username))
@@ -126,28 +192,44 @@ def profile(username):
     if form.validate_on_submit():
         user.phone = form.phone.data
 
-        # Handle avatar file upload
+        # Handle avatar file upload: thumbnailing runs in the background and
+        # sets user.avatar once it is done
         if form.avatar.data:
-            avatar = form.avatar.data
-            if avatar:
-                filename = secure_filename(avatar.filename)
-                avatar_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                avatar.save(avatar_path)
-                user.avatar = f'images/avatars/{filename}'
+            try:
+                submit_avatar(user.id, form.avatar.data.read())
+            except InvalidImageError as e:
+                flash(str(e), 'danger')
+                return render_template('profile.html', form=form, user=user)
+            flash('Your new avatar is being processed.', 'info')
 
         db.session.commit()
+        invalidate_user(user.id)
         flash('Your profile has been updated!', 'success')
         return redirect(url_for('user', username=user.username))
 
     return render_template('profile.html', form=form, user=user)
 
-@app.route("/subjects", methods=["GET"])
+@views.route("/avatars/identicon/<digest>-<int:size>.png", methods=["GET"])
+def identicon(digest, size):
+    # Identicons are content-addressed, so clients may cache them forever
+    path = os.path.join(avatars.IDENTICON_DIR, avatars.identicon_filename(secure_filename(digest), size))
+    if not os.path.isfile(path):
+        abort(404)
+    response = send_file(path, mimetype="image/png", etag=f"{digest}-{size}", max_age=365 * 24 * 3600, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@views.route("/subjects", methods=["GET"])
 @login_required
+@page_cache.conditional(lambda: ["subjects"])
 def subjects():
-    subjects = db.session.execute(sa.select(Subject)).scalars().all()
-    return render_template("subjects.html", subjects=subjects)
+    subject_list = page_cache.fragment("subject_list", ["subjects"], lambda: render_template(
+        "_subject_list.html", subjects=queries.subjects(**page_args())
+    ))
+    return render_template("subjects.html", subject_list=subject_list)
 
-@app.route("/subjects/new", methods=["GET", "POST"])
+@views.route("/subjects/new", methods=["GET", "POST"])
 @login_required
 def new_subject():
     form = SubjectForm()
@@ -160,7 +242,7 @@ def new_subject():
 
     return render_template("subject_form.html", form=form)
 
-@app.route("/subjects/<int:id>/edit", methods=["GET", "POST"])
+@views.route("/subjects/<int:id>/edit", methods=["GET", "POST"])
 @login_required
 def edit_subject(id):
     if not current_user.is_admin:
@@ -184,7 +266,7 @@ def edit_subject(id):
     
     return render_template("subject_form.html", form=form, subject=subject)
 
-@app.route("/subjects/<int:subject_id>/delete", methods=["POST"])
+@views.route("/subjects/<int:subject_id>/delete", methods=["POST"])
 @login_required
 def delete_subject(subject_id):
     if not current_user.is_admin:
@@ -202,14 +284,15 @@ def delete_subject(subject_id):
     flash("Subject deleted successfully!", "success")
     return redirect(url_for("subjects"))
 
-@app.route("/subjects/<int:subject_id>/topics", methods=["GET", "POST"])
+@views.route("/subjects/<int:subject_id>/topics", methods=["GET", "POST"])
 @login_required
+@page_cache.conditional(lambda subject_id: [("subject", subject_id)], forms=True)
 def topics(subject_id):
-    subject = db.first_or_404(sa.select(Subject).where(Subject.id==subject_id))
-    topics = db.session.scalars(sa.select(Topic).where(Topic.subject_id == subject_id)).all()
+    subject = queries.subject_with_topics(subject_id)
     if not subject:
         flash("Subject not found.", "danger")
         return redirect(url_for("subjects"))
+    topics = subject.topics
     
     form = TopicForm()
 
@@ -227,7 +310,7 @@ def topics(subject_id):
 
     return render_template("subject_topics.html", form=form, subject=subject, topics=topics)
 
-@app.route("/subjects/<int:subject_id>/topics/<int:topic_id>/edit", methods=["GET", "POST"])
+@views.route("/subjects/<int:subject_id>/topics/<int:topic_id>/edit", methods=["GET", "POST"])
 @login_required
 def edit_topic(subject_id, topic_id):
     topic = db.first_or_404(sa.select(Topic).where(
@@ -247,7 +330,7 @@ def edit_topic(subject_id, topic_id):
         return redirect(url_for('view_subject', subject_id=subject_id))
     return render_template("topic_form.html", form=form)
 
-@app.route("/subjects/<int:subject_id>/topics/<int:topic_id>/delete", methods=["GET", "POST"])
+@views.route("/subjects/<int:subject_id>/topics/<int:topic_id>/delete", methods=["GET", "POST"])
 @login_required
 def delete_topic(subject_id, topic_id):
     topic = db.session.scalar(sa.select(Topic).where(Topic.id == topic_id))
@@ -255,41 +338,53 @@ def delete_topic(subject_id, topic_id):
         flash("Topic not found.", "danger")
         return redirect(url_for("subjects"))
 
+    # Its questions stay in their quizzes, untagged
+    quiz_ids = db.session.scalars(
+        sa.update(QuizQuestion).where(QuizQuestion.topic_id == topic_id).values(topic_id=None).returning(QuizQuestion.quiz_id)
+    ).all()
     db.session.delete(topic)
     db.session.commit()
+    for quiz_id in set(quiz_ids):
+        invalidate_quiz(quiz_id)
+        sampling.invalidate(quiz_id)
+    page_cache.bump(*(("quiz", quiz_id) for quiz_id in set(quiz_ids)))
     flash("Topic deleted successfully!", "success")
     return redirect(url_for("view_subject", subject_id=subject_id))
 
-@app.route("/subjects/<int:subject_id>", methods=["GET", "POST"])
+@views.route("/subjects/<int:subject_id>", methods=["GET", "POST"])
+@page_cache.conditional(lambda subject_id: [("subject", subject_id)], forms=True)
 def view_subject(subject_id):
     subject = db.first_or_404(sa.select(Subject).where(Subject.id == subject_id))
     if not subject:
         flash("Subject not found.", "danger")
         return redirect(url_for("subjects"))
 
-    if current_user.is_anonymous and not current_user.is_admin:
-        quizzes = db.session.scalars(sa.select(Quiz).where(Quiz.subject_id == subject_id, Quiz.status == QuizStatusEnum.FROZEN.value))
-    else:
-        quizzes = db.session.scalars(sa.select(Quiz).where(Quiz.subject_id == subject_id))
-
     form = QuizForm()
 
     if form.validate_on_submit():
-        quiz = Quiz(duration=form.duration.data, status=form.status.data, quiz_subject=subject)
+        quiz = Quiz(duration=form.duration.data, status=form.status.data, sample_size=form.sample_size.data, quiz_subject=subject)
         db.session.add(quiz)
         db.session.commit()
         flash("Quiz created successfully!", "success")
         return redirect(url_for("view_subject", subject_id=subject_id))
 
-    return render_template("subject_details.html", form=form, subject=subject, quizzes=quizzes)
+    quiz_cards = page_cache.fragment("quiz_cards", [("subject", subject_id)], lambda: render_template(
+        "_quiz_cards.html", quizzes=queries.subject_quizzes(subject_id, frozen_only=current_user.is_anonymous, **page_args())
+    ))
+    return render_template("subject_details.html", form=form, subject=subject, quiz_cards=quiz_cards)
 
-@app.route("/subject/<int:subject_id>/quizzes/<int:quiz_id>", methods=["GET", "POST"])
+@views.route("/subject/<int:subject_id>/quizzes/<int:quiz_id>", methods=["GET", "POST"])
+# The subject's version covers the topic choices of the question form
+@page_cache.conditional(lambda subject_id, quiz_id: [("subject", subject_id), ("quiz", quiz_id)], forms=True)
 def view_quiz(subject_id, quiz_id):
+    # Only the page of questions being shown is loaded, not the whole quiz
     quiz = db.first_or_404(sa.select(Quiz).where(Quiz.id == quiz_id, Quiz.subject_id == subject_id))
-    questions = db.session.scalars(sa.select(QuizQuestion).where(QuizQuestion.quiz_id == quiz_id)).all()
     form = QuizQuestionForm()
+    form.topic.choices = queries.topic_choices(subject_id)
 
     if form.validate_on_submit():
+        # Checked before the insert, which indexes the new question too
+        duplicates = search.find_duplicates(form.question.data)
         # Create a new question
         new_question = QuizQuestion(
             question=form.question.data,
@@ -297,6 +392,8 @@ def view_quiz(subject_id, quiz_id):
             option2=form.option2.data,
             option3=form.option3.data,
             option4=form.option4.data,
+            position=navigation.next_position(quiz_id),  # Append to the end of the quiz
+            topic_id=form.topic.data or None,
             quiz_id=quiz_id  # Associate with the correct quiz
         )
 
@@ -313,13 +410,87 @@ def view_quiz(subject_id, quiz_id):
         new_question_answer.question_id = new_question.id  # Set the foreign key
         db.session.add(new_question_answer)
         db.session.commit()
+        invalidate_quiz(quiz_id)
+        navigation.add_question(quiz_id, new_question.id, new_question.position)
+        sampling.add_question(quiz_id, new_question.id, new_question.topic_id)
 
         flash("Question created successfully!", "success")
-        return redirect(url_for("view_quiz", subject_id=quiz.subject_id, quiz_id=quiz_id))
+        if duplicates:
+            flash(f"A similar question already exists in quiz {duplicates[0].quiz_id}: {duplicates[0].question}", "warning")
+        return redirect(url_for("view_quiz", subject_id=subject_id, quiz_id=quiz_id))
+
+    return render_template(
+        "quiz_details.html",
+        quiz=quiz,
+        form=form,
+        import_form=QuestionImportForm(),
+        question_list=page_cache.fragment("question_list", [("quiz", quiz_id)], lambda: render_template(
+            "_question_list.html", questions=queries.quiz_question_page(quiz_id, **page_args())
+        ))
+    )
+
+@views.route("/subject/<int:subject_id>/quizzes/<int:quiz_id>/import", methods=["POST"])
+@login_required
+def import_quiz_questions(subject_id, quiz_id):
+    if not current_user.is_admin:
+        flash("permission denied", "danger")
+        return redirect(url_for("view_quiz", subject_id=subject_id, quiz_id=quiz_id))
+
+    db.first_or_404(sa.select(Quiz).where(Quiz.id == quiz_id, Quiz.subject_id == subject_id))
+    # Question banks may be larger than the global upload limit
+    request.max_content_length = current_app.config['QUESTION_IMPORT_MAX_BYTES']
+    form = QuestionImportForm()
+
+    if form.validate_on_submit():
+        upload = form.file.data
+        fmt = 'jsonl' if upload.filename.lower().endswith('.jsonl') else 'csv'
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+        try:
+            result = import_questions(quiz_id, stream, fmt, skip_duplicates=form.skip_duplicates.data)
+        except (QuestionImportError, UnicodeDecodeError) as e:
+            flash(f"Import failed: {e}", "danger")
+        else:
+            flash(f"Imported {result.imported} questions.", "success")
+            if result.skipped:
+                flash(f"Skipped {result.skipped} near-duplicates of existing questions.", "warning")
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                flash(error, "danger")
+
+    return redirect(url_for("view_quiz", subject_id=subject_id, quiz_id=quiz_id))
+
+def _export_response(filename, fmt, **source):
+    if fmt not in FORMATS:
+        abort(400)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(export_questions(fmt, **source)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'}
+    )
 
-    return render_template("quiz_details.html", quiz=quiz, form=form, questions=questions)
+@views.route("/subject/<int:subject_id>/quizzes/<int:quiz_id>/export", methods=["GET"])
+@login_required
+def export_quiz_questions(subject_id, quiz_id):
+    if not current_user.is_admin:
+        flash("permission denied", "danger")
+        return redirect(url_for("view_subject", subject_id=subject_id))
 
-@app.route("/subject/<int:subject_id>/quizzes/<int:quiz_id>/edit", methods=["GET", "POST"])
+    db.first_or_404(sa.select(Quiz).where(Quiz.id == quiz_id, Quiz.subject_id == subject_id))
+    return _export_response(f"quiz-{quiz_id}", request.args.get('format', 'csv'), quiz_id=quiz_id)
+
+@views.route("/subjects/<int:subject_id>/export", methods=["GET"])
+@login_required
+def export_subject_questions(subject_id):
+    if not current_user.is_admin:
+        flash("permission denied", "danger")
+        return redirect(url_for("view_subject", subject_id=subject_id))
+
+    db.first_or_404(sa.select(Subject).where(Subject.id == subject_id))
+    return _export_response(f"subject-{subject_id}", request.args.get('format', 'csv'), subject_id=subject_id)
+
+@views.route("/subject/<int:subject_id>/quizzes/<int:quiz_id>/edit", methods=["GET", "POST"])
 @login_required
 def edit_quiz(subject_id, quiz_id):
     quiz = db.first_or_404(sa.select(Quiz).where(Quiz.id == quiz_id, Quiz.subject_id == subject_id))
@@ -328,162 +499,474 @@ def edit_quiz(subject_id, quiz_id):
     if request.method == "GET":
         form.duration.data = quiz.duration.name
         form.status.data = quiz.status.name
+        form.sample_size.data = quiz.sample_size
 
     if form.validate_on_submit():
         quiz.duration = QuestionDurationEnum[form.duration.data]
         quiz.status = QuizStatusEnum[form.status.data]
+        quiz.sample_size = form.sample_size.data
         db.session.commit()
+        invalidate_quiz(quiz_id)
         return redirect(url_for("view_subject", subject_id=subject_id))
 
     return render_template("quiz_form.html", form=form)
 
 # Route for deleting a quiz
-@app.route('/subject/<int:subject_id>/quizzes/<int:quiz_id>', methods=['POST'])
+@views.route('/subject/<int:subject_id>/quizzes/<int:quiz_id>', methods=['POST'])
 def delete_quiz(subject_id, quiz_id):
     quiz = db.first_or_404(sa.select(Quiz).where(Quiz.id == quiz_id, Quiz.subject_id == subject_id))
 
     if not current_user.is_anonymous and current_user.is_admin:
             db.session.delete(quiz)
             db.session.commit()
+            invalidate_quiz(quiz_id)
+            navigation.invalidate(quiz_id)
+            sampling.invalidate(quiz_id)
     
     return redirect(url_for('view_subject', subject_id=subject_id))
 
-@app.route('/subjects/<int:subject_id>/tests/<int:test_id>/question/<int:question_id>', methods=['GET', 'POST'])
+@views.route('/subjects/<int:subject_id>/tests/<int:test_id>/question/<int:question_id>', methods=['GET', 'POST'])
+@login_required
 def question(subject_id, test_id, question_id):
-    # Get the current question from the database
-    question = db.first_or_404(sa.select(QuizQuestion).where(
-        QuizQuestion.quiz_id==test_id, 
-        QuizQuestion.id==question_id
-    ))
+    # Get the current question from the cached quiz content
+    content = get_quiz_content(test_id, question_id)
+    question = find_question(content, question_id) if content else None
+    if question is None:
+        abort(404)
+
+    # The server owns the clock: the question's timer starts the first time it is served
+    attempt = timing.start_attempt(current_user.id, test_id)
+    drawn = sampling.attempt_questions(attempt, content)
+    if drawn is not None and question_id not in drawn:
+        abort(404)  # Not one of the questions drawn for this attempt
+    timer = timing.question_timer(attempt, question_id)
+    late = timing.is_late(timer.deadline_at)
+    # This candidate's question order and option layout
+    permutation = shuffle.for_attempt(current_user.id, test_id, attempt)
 
     user_answer_record = db.session.scalar(sa.select(QuizQuestionUserAnswers).where(
         QuizQuestionUserAnswers.question_id == question_id,
         QuizQuestionUserAnswers.author_id == current_user.id
     ))
+    # An answer still waiting in the write buffer is newer than the stored one
+    pending_answer = answer_writer.pending(current_user.id, question_id)
+    if pending_answer:
+        answer = pending_answer["answer"]
+        frozen = pending_answer["frozen"] or bool(user_answer_record and user_answer_record.frozen)
+    elif user_answer_record:
+        answer = user_answer_record.answer
+        frozen = user_answer_record.frozen
+    else:
+        answer, frozen = None, False
+
+    if late and not frozen:
+        # Time ran out without the browser freezing the question, so freeze it here
+        answer_writer.submit(current_user.id, question_id, answer, frozen=True)
+        frozen = True
     
     # Initialize the form
     form = QuizQuestionAnswerForm()
     form.answer.choices = [
-        (1, question.option1),
-        (2, question.option2),
-        (3, question.option3),
-        (4, question.option4),
+        (number, question[f"option{option}"])
+        for number, option in enumerate(permutation.options(question_id), start=1)
     ]
 
     # If the question is frozen and the user has answered, pre-fill the form with the previous answer
-    if user_answer_record:
-        if user_answer_record.frozen:  # Check if the question is frozen
-            form.frozen.data = 'True'  # Set frozen field to True to indicate that the question is frozen
-            # Disable the form (in HTML) using JavaScript
-            form.answer.render_kw = {'disabled': True}  # Disable the answer options
-            form.submit.render_kw = {'disabled': True}  # Disable the submit button
-        if user_answer_record.answer:
-            form.answer.data = user_answer_record.answer  # Pre-fill with the previous answer
+    if frozen:  # Check if the question is frozen
+        form.frozen.data = 'True'  # Set frozen field to True to indicate that the question is frozen
+        # Disable the form (in HTML) using JavaScript
+        form.answer.render_kw = {'disabled': True}  # Disable the answer options
+        form.submit.render_kw = {'disabled': True}  # Disable the submit button
+    if answer and request.method == 'GET':
+        form.answer.data = str(permutation.to_displayed(question_id, answer))  # Pre-fill with the previous answer
     if form.validate_on_submit():
+        if frozen:
+            # Late or frozen earlier: the stored answer stands
+            flash("Time is up for this question, your answer was not saved.", "warning")
+            return redirect(url_for('next_question', subject_id=subject_id, test_id=test_id, question_id=question_id))
+
         user_answer = form.answer.data or None # Get the selected answer
-        user = current_user
-
-        # user_answer_record = db.session.scalar(sa.select(QuizQuestionUserAnswers).where(
-        #     QuizQuestionUserAnswers.question_id==question_id,
-        #     QuizQuestionUserAnswers.author_id==user.id
-        # ))
-        if user_answer_record:
-            user_answer_record.answer = int(user_answer) if user_answer is not None else None
-            if not user_answer_record.frozen:
-                user_answer_record.frozen = form.frozen.data == 'True'
-        else:
-            user_answer_record = QuizQuestionUserAnswers(
-                answer=int(user_answer) if user_answer is not None else None,
-                question_id=question.id,
-                author_id=user.id
-            )
-            db.session.add(user_answer_record)
 
-        db.session.commit()
+        # Queue the upsert; the answer writer commits it with other answers in one batch.
+        # Answers are stored as the canonical option so scoring and analytics ignore the layout
+        answer_writer.submit(
+            current_user.id,
+            question_id,
+            permutation.to_canonical(question_id, int(user_answer)) if user_answer is not None else None,
+            frozen=form.frozen.data == 'True'
+        )
+        if user_answer is not None:
+            monitoring.answer_recorded(test_id, current_user.id, question_id)
 
         return redirect(url_for('next_question', subject_id=subject_id, test_id=test_id, question_id=question_id))
     else:
-        print(form.errors)
+        instrumentation.record_form_errors(form)
+
+    sequence = navigation.get_sequence(test_id, question_id, permutation, drawn)
+    return render_template(
+        'test_question.html',
+        question=question,
+        form=form,
+        subject_id=subject_id,
+        test_id=test_id,
+        question_number=sequence.number(question_id),
+        total_questions=len(sequence),
+        has_previous=sequence.previous(question_id) is not None,
+        time_remaining=int(timing.seconds_left(timer))
+    )
 
-    return render_template('test_question.html', question=question, form=form, subject_id=subject_id, test_id=test_id)
+def candidate_sequence(test_id, question_id=None):
+    # The questions of the current user's open attempt, in their order
+    attempt = timing.current_attempt(current_user.id, test_id)
+    return navigation.get_sequence(
+        test_id, question_id,
+        permutation=shuffle.for_attempt(current_user.id, test_id, attempt),
+        drawn=sampling.attempt_questions(attempt, get_quiz_content(test_id))
+    )
 
-@app.route('/subjects/<int:subject_id>/tests/<int:test_id>/question/<int:question_id>/next', methods=['GET'])
+@views.route('/subjects/<int:subject_id>/tests/<int:test_id>/question/<int:question_id>/next', methods=['GET'])
+@login_required
 def next_question(subject_id, test_id, question_id):
-    # Get the next question
-    next_question = db.session.scalars(sa.select(QuizQuestion).where(QuizQuestion.id > question_id)).first()
-    # .query.filter(QuizQuestion.id > question_id).first()
-    
-    if next_question:
-        return redirect(url_for('question', subject_id=subject_id, test_id=test_id, question_id=next_question.id))
+    # Get the next question of this quiz from its navigation index
+    sequence = candidate_sequence(test_id, question_id)
+    next_question_id = sequence.next(question_id) if question_id in sequence else None
+
+    if next_question_id:
+        return redirect(url_for('question', subject_id=subject_id, test_id=test_id, question_id=next_question_id))
     else:
-        # return "Test Completed!"
-        return redirect(url_for('submit_quiz', quiz_id=test_id))
+        # Submitting is a POST, so following a link never ends the quiz
+        return render_template(
+            'submit_quiz.html', form=SubmitQuizForm(), subject_id=subject_id, test_id=test_id, question_id=question_id
+        )
 
-@app.route('/subjects/<int:subject_id>/tests/<int:test_id>/start', methods=['GET'])
+@views.route('/subjects/<int:subject_id>/tests/<int:test_id>/question/<int:question_id>/previous', methods=['GET'])
+@login_required
+def previous_question(subject_id, test_id, question_id):
+    sequence = candidate_sequence(test_id, question_id)
+    previous_question_id = sequence.previous(question_id) if question_id in sequence else None
+
+    if previous_question_id:
+        return redirect(url_for('question', subject_id=subject_id, test_id=test_id, question_id=previous_question_id))
+    return redirect(url_for('question', subject_id=subject_id, test_id=test_id, question_id=question_id))
+
+@views.route('/subjects/<int:subject_id>/tests/<int:test_id>/start', methods=['GET'])
+@login_required
 def start_quiz(subject_id, test_id):
     # Get the first question of the quiz based on test_id
-    first_question = db.session.scalars(sa.select(QuizQuestion).where(QuizQuestion.quiz_id==test_id)).first()
-    # .query.filter_by(quiz_id=test_id).first()
-    
-    if first_question:
-        return redirect(url_for('question', subject_id=subject_id, test_id=test_id, question_id=first_question.id))
+    if len(navigation.get_sequence(test_id)):
+        attempt = timing.start_attempt(current_user.id, test_id)
+        first_question_id = navigation.get_sequence(
+            test_id,
+            permutation=shuffle.for_attempt(current_user.id, test_id, attempt),
+            drawn=sampling.attempt_questions(attempt, get_quiz_content(test_id))
+        ).first()
+        return redirect(url_for('question', subject_id=subject_id, test_id=test_id, question_id=first_question_id))
     else:
         return "No questions found for this quiz.", 404
     
-def calculate_score(user_id, quiz_id):
-    # Get all quiz questions for the particular quiz
-    quiz = Quiz.query.get(quiz_id)
-    correct_answers = 0
-
-    for question in quiz.questions:
-        # Get the user's answer for this question
-        user_answer = QuizQuestionUserAnswers.query.filter_by(author_id=user_id, question_id=question.id).first()
+def served_questions(content, permutation, drawn):
+    # The attempt's questions in the order the single-page quiz serves them
+    questions = {
+        question["id"]: question
+        for question in content["questions"]
+        if drawn is None or question["id"] in drawn
+    }
+    return [questions[question_id] for question_id in permutation.order(questions)]
+
+def quiz_payload(quiz, user_id, attempt):
+    # Everything a candidate needs to take the quiz, without the correct answers,
+    # limited to the attempt's draw and in the candidate's question order and option layout
+    content = get_quiz_content(quiz.id)
+    permutation = shuffle.for_attempt(user_id, quiz.id, attempt)
+    questions = served_questions(content, permutation, sampling.attempt_questions(attempt, content))
+    answers = {
+        record.question_id: record
+        for record in db.session.scalars(sa.select(QuizQuestionUserAnswers).where(
+            QuizQuestionUserAnswers.author_id == user_id,
+            QuizQuestionUserAnswers.question_id.in_([question["id"] for question in questions])
+        ))
+    }
+    return {
+        "id": quiz.id,
+        "subject_id": quiz.subject_id,
+        "time_limit": question_time_limit(quiz),
+        "questions": [
+            {
+                "id": question["id"],
+                "number": number,
+                "question": question["question"],
+                "options": [question[f"option{option}"] for option in permutation.options(question["id"])],
+                "answer": permutation.to_displayed(question["id"], answers[question["id"]].answer) if question["id"] in answers else None,
+                "frozen": bool(answers[question["id"]].frozen) if question["id"] in answers else False,
+            }
+            for number, question in enumerate(questions, start=1)
+        ],
+    }
+
+@views.route('/subjects/<int:subject_id>/tests/<int:test_id>/single', methods=['GET'])
+@login_required
+def single_page_quiz(subject_id, test_id):
+    quiz = db.first_or_404(sa.select(Quiz).where(Quiz.id == test_id, Quiz.subject_id == subject_id))
+    # The attempt's start bounds client timestamps and its deadline ends submissions
+    attempt = timing.start_attempt(current_user.id, quiz.id)
+    return render_template(
+        "quiz_single.html",
+        quiz=quiz,
+        payload=quiz_payload(quiz, current_user.id, attempt),
+        csrf_token=generate_csrf()
+    )
+
+@views.route('/api/quizzes/<int:quiz_id>', methods=['GET'])
+@login_required
+def quiz_json(quiz_id):
+    quiz = db.get_or_404(Quiz, quiz_id)
+    attempt = timing.start_attempt(current_user.id, quiz.id)
+    return jsonify(quiz_payload(quiz, current_user.id, attempt))
+
+@views.route('/api/quizzes/<int:quiz_id>/answers', methods=['POST'])
+@login_required
+def submit_answers(quiz_id):
+    quiz = db.get_or_404(Quiz, quiz_id)
+
+    if current_app.config.get('WTF_CSRF_ENABLED', True):
         try:
-            if user_answer:
-                # Check if the answer is correct
-                if user_answer.answer == question.answer.option.value:
-                    correct_answers += 1
-        except Exception as e:
-            print(e)
-    total_questions = len(quiz.questions)
-    score = correct_answers
-    is_passed = score >= (total_questions / 2)  # For example, passing score is 50%
+            validate_csrf(request.headers.get('X-CSRFToken'))
+        except ValidationError as e:
+            return jsonify(error=str(e)), 400
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get("answers"), list):
+        return jsonify(error="Expected a JSON object with an 'answers' list"), 400
+
+    answer_writer.flush()  # Buffered answers must be visible to the bulk upsert
+    try:
+        attempt = timing.start_attempt(current_user.id, quiz.id)
+        content = get_quiz_content(quiz.id)
+        permutation = shuffle.for_attempt(current_user.id, quiz.id, attempt)
+        drawn = sampling.attempt_questions(attempt, content)
+        order = [question["id"] for question in served_questions(content, permutation, drawn)]
+
+        def question_deadlines(question_ids):
+            # Per-question timers run on the server's clock, chained in the served order
+            deadlines = timing.chained_deadlines(attempt, order, question_ids)
+            return {question_id: timing.epoch(deadline_at) for question_id, deadline_at in deadlines.items()}
+
+        result = save_answers(
+            current_user.id, quiz, data["answers"],
+            served_at=timing.epoch(attempt.started_at),
+            deadline=timing.epoch(attempt.deadline_at),
+            permutation=permutation,
+            drawn=drawn,
+            question_deadlines=question_deadlines
+        )
+    except AnswerSubmissionError as e:
+        return jsonify(error=str(e)), 400
+    for question_id in result["saved"]:
+        monitoring.answer_recorded(quiz.id, current_user.id, question_id)
 
-    return score, total_questions, is_passed
+    result["submit_url"] = url_for('submit_quiz', quiz_id=quiz.id)
+    return jsonify(result)
 
-@app.route("/submit_quiz/<int:quiz_id>", methods=["GET", "POST"])
+@views.route("/admin/cache", methods=["GET"])
 @login_required
-def submit_quiz(quiz_id):
-    # Start the timer for the quiz submission
-    start_time = time.time()
-
-    # Get the score, total questions, and passing status
-    score, total_questions, is_passed = calculate_score(current_user.id, quiz_id)
-
-    # Calculate the time taken to complete the quiz
-    time_taken = time.time() - start_time
-
-    # Create a new TestResult
-    test_result = TestResult(
-        user_id=current_user.id,
-        quiz_id=quiz_id,
-        score=score,
-        total_questions=total_questions,
-        time_taken=time_taken,
-        is_passed=is_passed
+def cache_stats():
+    if not current_user.is_admin:
+        flash("permission denied", "danger")
+        return redirect(url_for("index"))
+    return jsonify(quiz_content=quiz_cache.stats(), answer_writer=answer_writer.stats(), pages=page_cache.stats())
+
+def _metrics_allowed():
+    # Scrapers authenticate with a bearer token, people with an admin session
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return current_user.is_authenticated and current_user.is_admin
+
+@views.route("/admin/metrics", methods=["GET"])
+def metrics():
+    if not _metrics_allowed():
+        abort(403)
+    gauges = {}
+    for prefix, stats in (("quizz_quiz_content_cache", quiz_cache.stats()), ("quizz_answer_writer", answer_writer.stats())):
+        for key, value in stats.items():
+            if isinstance(value, (int, float)):
+                gauges[f"{prefix}_{key}"] = value
+    return Response(instrumentation.render_metrics(gauges), mimetype="text/plain; version=0.0.4")
+
+@views.route("/admin/metrics/slow", methods=["GET"])
+def slow_requests():
+    if not _metrics_allowed():
+        abort(403)
+    return jsonify(list(instrumentation.slow_requests))
+
+@views.route("/admin/profiling", methods=["GET", "POST"])
+@login_required
+def profiling():
+    if not current_user.is_admin:
+        flash("permission denied", "danger")
+        return redirect(url_for("index"))
+    profiler = instrumentation.profiler
+    if request.method == "POST":
+        # Toggle sampling of requests into cProfile dumps at runtime
+        values = request.get_json(silent=True) or request.form
+        try:
+            sample_rate = float(values["sample_rate"]) if "sample_rate" in values else profiler.sample_rate
+            threshold = float(values["threshold_seconds"]) if "threshold_seconds" in values else profiler.threshold
+        except (TypeError, ValueError):
+            return jsonify(error="sample_rate and threshold_seconds must be numbers"), 400
+        # NaN would pass the clamps below unchanged
+        if not (math.isfinite(sample_rate) and math.isfinite(threshold)):
+            return jsonify(error="sample_rate and threshold_seconds must be finite numbers"), 400
+        if "enabled" in values:
+            profiler.enabled = str(values["enabled"]).lower() in ("1", "true", "on", "yes")
+        profiler.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        profiler.threshold = max(threshold, 0.0)
+    return jsonify(profiler.settings())
+
+@views.route("/admin/search", methods=["GET"])
+@login_required
+def search_view():
+    if not current_user.is_admin:
+        flash("permission denied", "danger")
+        return redirect(url_for("index"))
+    query = request.args.get("q", "").strip()
+    kind = request.args.get("kind")
+    if kind not in search.KINDS:
+        kind = None
+    page = max(request.args.get("page", 1, type=int), 1)
+    results = search.search(query, kinds=[kind] if kind else None, page=page)
+    return render_template("search.html", query=query, kind=kind, kinds=list(search.KINDS), results=results)
+
+def _render_leaderboard(title, kind, board_id, back_url):
+    rows, my_rank, entries = leaderboard.standings(kind, board_id, k=10, user_id=current_user.id)
+    usernames = dict(db.session.execute(
+        sa.select(User.id, User.username).where(User.id.in_([row[1] for row in rows]))
+    ).all())
+    return render_template(
+        "leaderboard.html",
+        title=title,
+        rows=[(rank, usernames.get(user_id), score, time_taken) for rank, user_id, score, time_taken in rows],
+        my_rank=my_rank,
+        entries=entries,
+        back_url=back_url
     )
 
-    # Add the result to the session and commit to the database
-    db.session.add(test_result)
-    db.session.commit()
+@views.route("/subject/<int:subject_id>/quizzes/<int:quiz_id>/leaderboard", methods=["GET"])
+@login_required
+def quiz_leaderboard(subject_id, quiz_id):
+    quiz = get_quiz_content(quiz_id)
+    if quiz is None or quiz["subject_id"] != subject_id:
+        abort(404)
+    return _render_leaderboard(
+        f"Quiz {quiz_id} leaderboard", 'quiz', quiz_id,
+        url_for("view_quiz", subject_id=subject_id, quiz_id=quiz_id)
+    )
+
+@views.route("/subjects/<int:subject_id>/leaderboard", methods=["GET"])
+@login_required
+def subject_leaderboard(subject_id):
+    subject = db.first_or_404(sa.select(Subject).where(Subject.id == subject_id))
+    return _render_leaderboard(
+        f"{subject.name} leaderboard", 'subject', subject_id,
+        url_for("view_subject", subject_id=subject_id)
+    )
+
+@views.route("/admin/leaderboards/rebuild", methods=["POST"])
+@login_required
+def rebuild_leaderboards():
+    if not current_user.is_admin:
+        flash("permission denied", "danger")
+        return redirect(url_for("index"))
+    return jsonify(boards=leaderboard.rebuild_all())
+
+@views.route("/subject/<int:subject_id>/quizzes/<int:quiz_id>/analytics", methods=["GET"])
+@login_required
+def quiz_analytics(subject_id, quiz_id):
+    if not current_user.is_admin:
+        flash("permission denied", "danger")
+        return redirect(url_for("view_subject", subject_id=subject_id))
+
+    report = quiz_report(quiz_id)
+    if report is None or get_quiz_content(quiz_id)["subject_id"] != subject_id:
+        abort(404)
+    return render_template("quiz_analytics.html", subject_id=subject_id, report=report)
+
+@views.route("/subject/<int:subject_id>/quizzes/<int:quiz_id>/monitor", methods=["GET"])
+@login_required
+def quiz_monitor(subject_id, quiz_id):
+    if not current_user.is_admin:
+        flash("permission denied", "danger")
+        return redirect(url_for("view_subject", subject_id=subject_id))
+    quiz = get_quiz_content(quiz_id)
+    if quiz is None or quiz["subject_id"] != subject_id:
+        abort(404)
+    return render_template("quiz_monitor.html", quiz=quiz)
+
+@views.route("/api/quizzes/<int:quiz_id>/progress/stream", methods=["GET"])
+@login_required
+def quiz_progress_stream(quiz_id):
+    if not current_user.is_admin:
+        return jsonify(error="permission denied"), 403
+    quiz = get_quiz_content(quiz_id)
+    if quiz is None:
+        abort(404)
+    progress = monitoring.progress_for(quiz_id, [question["id"] for question in quiz["questions"]])
+    # Each open stream holds a server thread, so cap how many run at once
+    if not monitoring.acquire_watcher(current_app.config.get('MONITOR_MAX_WATCHERS', 8)):
+        return jsonify(error="too many monitoring streams open"), 503
+    response = Response(
+        monitoring.event_stream(progress, current_app.config.get('MONITOR_STREAM_SECONDS', 300)),
+        mimetype="text/event-stream"
+    )
+    response.call_on_close(monitoring.release_watcher)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # Stop proxies from buffering the stream
+    return response
+
+@views.route("/api/quizzes/<int:quiz_id>/analytics", methods=["GET"])
+@login_required
+def quiz_analytics_json(quiz_id):
+    if not current_user.is_admin:
+        return jsonify(error="permission denied"), 403
+
+    report = quiz_report(quiz_id)
+    if report is None:
+        abort(404)
+    return jsonify(report)
+
+@views.route("/submit_quiz/<int:quiz_id>", methods=["POST"])
+@login_required
+def submit_quiz(quiz_id):
+    quiz = db.get_or_404(Quiz, quiz_id)
+    form = SubmitQuizForm()
+    if not form.validate_on_submit():
+        flash("The quiz could not be submitted, please try again.", "danger")
+        return redirect(url_for("view_subject", subject_id=quiz.subject_id))
+
+    # Make sure every buffered answer is stored before scoring
+    answer_writer.flush()
+
+    # Score the attempt; time taken runs from when the server started the attempt.
+    # Without an open attempt this is the result of the one submitted last
+    test_result = timing.finish_attempt(current_user.id, quiz_id)
+    if test_result is None:
+        abort(404)
+    leaderboard.record_result(test_result, quiz.subject_id)
 
     # Redirect the user to the result page
     return redirect(url_for("view_test_result", test_result_id=test_result.id))
 
-@app.route("/test_result/<int:test_result_id>")
+@views.route("/results", methods=["GET"])
+@login_required
+def result_history():
+    return render_template("result_history.html", results=queries.user_results(current_user.id, **page_args()))
+
+@views.route("/test_result/<int:test_result_id>")
 @login_required
 def view_test_result(test_result_id):
-    test_result = TestResult.query.get_or_404(test_result_id)
+    test_result = queries.test_result(test_result_id)
+    if test_result is None:
+        abort(404)
 
     # Ensure that the test result belongs to the current user
     if test_result.user_id != current_user.id:
@@ -0,0 +1,117 @@
+import random
+import threading
+from array import array
+import sqlalchemy as sa
+from app import db
+from app.cache import LRUCache
+from app.models import QuizQuestion, QuizAttemptQuestion
+
+_random = random.Random()
+
+
+class QuestionPool:
+    """Question ids of a quiz's bank, grouped by topic in compact arrays.
+
+    Each topic's ids are an array of 64-bit ints, about 8 bytes per question,
+    so a 10k question bank takes ~80kB. New questions are appended in place;
+    anything that moves or drops questions (a topic or quiz delete, an
+    import) invalidates the pool and it reloads on the next draw.
+    """
+
+    def __init__(self, quiz_id):
+        self.quiz_id = quiz_id
+        self.strata = {}  # Topic id, or None for untagged questions -> array of question ids
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.strata.values())
+
+    def add(self, question_id, topic_id=None):
+        with self._lock:
+            self.strata.setdefault(topic_id, array('q')).append(question_id)
+
+    def sample(self, k, rng=_random):
+        """Draw k distinct question ids, spread over topics in proportion to their size.
+
+        Each topic gets its floor share and the remainder goes to the largest
+        fractions. Drawing from a topic is O(share), so the cost depends on k and
+        the number of topics, not on the size of the bank.
+        """
+        with self._lock:
+            strata = [(topic_id, ids) for topic_id, ids in self.strata.items() if ids]
+            total = sum(len(ids) for _, ids in strata)
+            if k >= total:
+                return [question_id for _, ids in strata for question_id in ids]
+
+            shares = [k * len(ids) / total for _, ids in strata]
+            quotas = [int(share) for share in shares]
+            by_remainder = sorted(range(len(strata)), key=lambda i: shares[i] - quotas[i], reverse=True)
+            for i in by_remainder[:k - sum(quotas)]:
+                quotas[i] += 1
+
+            drawn = []
+            for (_, ids), quota in zip(strata, quotas):
+                drawn.extend(ids[i] for i in rng.sample(range(len(ids)), quota))
+            return drawn
+
+
+_pools = {}
+_drawn = LRUCache(8 * 1024 * 1024)  # Attempt id -> ids drawn for it; they never change
+_lock = threading.Lock()
+
+
+def _load_pool(quiz_id):
+    pool = QuestionPool(quiz_id)
+    rows = db.session.execute(
+        sa.select(QuizQuestion.id, QuizQuestion.topic_id).where(QuizQuestion.quiz_id == quiz_id)
+    )
+    for question_id, topic_id in rows:
+        pool.add(question_id, topic_id)
+    return pool
+
+
+def get_pool(quiz_id):
+    pool = _pools.get(quiz_id)
+    if pool is None:
+        pool = _load_pool(quiz_id)
+        with _lock:
+            pool = _pools.setdefault(quiz_id, pool)
+    return pool
+
+
+def add_question(quiz_id, question_id, topic_id=None):
+    # Only pools already in memory need updating; others load with the question
+    pool = _pools.get(quiz_id)
+    if pool is not None:
+        pool.add(question_id, topic_id)
+
+
+def invalidate(quiz_id):
+    with _lock:
+        _pools.pop(quiz_id, None)
+
+
+def draw(quiz_id, sample_size):
+    return get_pool(quiz_id).sample(sample_size)
+
+
+def record_draw(attempt_id, question_ids):
+    """Add the drawn questions of a new attempt to the session; the caller commits."""
+    if question_ids:
+        db.session.execute(sa.insert(QuizAttemptQuestion), [
+            {"attempt_id": attempt_id, "question_id": question_id} for question_id in question_ids
+        ])
+
+
+def attempt_questions(attempt, content):
+    """Return the question ids drawn for an attempt, or None when it serves the whole quiz."""
+    if attempt is None or not content or not content.get("sample_size"):
+        return None
+    question_ids = _drawn.get(attempt.id)
+    if question_ids is None:
+        question_ids = frozenset(db.session.scalars(
+            sa.select(QuizAttemptQuestion.question_id).where(QuizAttemptQuestion.attempt_id == attempt.id)
+        ))
+        _drawn.set(attempt.id, question_ids)
+    # Attempts started before the quiz was sampled have no draw
+    return question_ids or None
@@ -0,0 +1,105 @@
+from typing import NamedTuple
+import sqlalchemy as sa
+from app import db
+from app.models import QuizQuestion, QuizQuestionAnswer, QuizQuestionUserAnswers, QuizAttempt, QuizAttemptQuestion
+from app.enums import QuestionAnswerEnum
+
+PASS_RATIO = 0.5  # A candidate passes with at least half of the questions right
+
+
+class Score(NamedTuple):
+    score: int
+    total_questions: int
+    is_passed: bool
+
+
+def _score(correct, total):
+    correct = int(correct or 0)
+    total = int(total or 0)
+    return Score(correct, total, correct >= total * PASS_RATIO)
+
+
+def _correct_question_id():
+    # QuizQuestionAnswer.option is stored as the enum name while user answers are
+    # plain integers, so map the stored option back to its number inside the query.
+    correct_option = sa.case(
+        *[(QuizQuestionAnswer.option == option, option.value) for option in QuestionAnswerEnum]
+    )
+    # Counting distinct question ids keeps duplicate answer rows from inflating the score
+    return sa.case((QuizQuestionUserAnswers.answer == correct_option, QuizQuestion.id))
+
+
+def score_attempt(user_id, quiz_id, question_ids=None):
+    """Score one user's attempt at a quiz with a single aggregate query.
+
+    ``question_ids`` limits scoring to the questions drawn for a sampled attempt.
+    """
+    stmt = (
+        sa.select(
+            sa.func.count(sa.distinct(_correct_question_id())),
+            sa.func.count(sa.distinct(QuizQuestion.id)),
+        )
+        .select_from(QuizQuestion)
+        .outerjoin(QuizQuestionAnswer, QuizQuestionAnswer.question_id == QuizQuestion.id)
+        .outerjoin(QuizQuestionUserAnswers, sa.and_(
+            QuizQuestionUserAnswers.question_id == QuizQuestion.id,
+            QuizQuestionUserAnswers.author_id == user_id,
+        ))
+        .where(QuizQuestion.quiz_id == quiz_id)
+    )
+    if question_ids is not None:
+        stmt = stmt.where(QuizQuestion.id.in_(question_ids))
+    correct, total = db.session.execute(stmt).one()
+    return _score(correct, total)
+
+
+def score_attempts(attempt_ids):
+    """Score sampled attempts on the questions drawn for each, in one statement.
+
+    Returns a dict of attempt id to Score; attempts without drawn questions are left out.
+    """
+    stmt = (
+        sa.select(
+            QuizAttemptQuestion.attempt_id,
+            sa.func.count(sa.distinct(_correct_question_id())),
+            sa.func.count(sa.distinct(QuizQuestion.id)),
+        )
+        .select_from(QuizAttemptQuestion)
+        .join(QuizAttempt, QuizAttempt.id == QuizAttemptQuestion.attempt_id)
+        .join(QuizQuestion, QuizQuestion.id == QuizAttemptQuestion.question_id)
+        .outerjoin(QuizQuestionAnswer, QuizQuestionAnswer.question_id == QuizQuestion.id)
+        .outerjoin(QuizQuestionUserAnswers, sa.and_(
+            QuizQuestionUserAnswers.question_id == QuizQuestion.id,
+            QuizQuestionUserAnswers.author_id == QuizAttempt.user_id,
+        ))
+        .where(QuizAttemptQuestion.attempt_id.in_(attempt_ids))
+        .group_by(QuizAttemptQuestion.attempt_id)
+    )
+    return {attempt_id: _score(correct, total) for attempt_id, correct, total in db.session.execute(stmt)}
+
+
+def score_quiz(quiz_id, user_ids=None):
+    """Score every participant of a quiz, or only ``user_ids``, in one statement.
+
+    Returns a dict of user id to Score for each user that answered at least one question.
+    """
+    total = (
+        sa.select(sa.func.count(QuizQuestion.id))
+        .where(QuizQuestion.quiz_id == quiz_id)
+        .scalar_subquery()
+    )
+    stmt = (
+        sa.select(
+            QuizQuestionUserAnswers.author_id,
+            sa.func.count(sa.distinct(_correct_question_id())),
+            total,
+        )
+        .select_from(QuizQuestion)
+        .join(QuizQuestionUserAnswers, QuizQuestionUserAnswers.question_id == QuizQuestion.id)
+        .outerjoin(QuizQuestionAnswer, QuizQuestionAnswer.question_id == QuizQuestion.id)
+        .where(QuizQuestion.quiz_id == quiz_id)
+        .group_by(QuizQuestionUserAnswers.author_id)
+    )
+    if user_ids is not None:
+        stmt = stmt.where(QuizQuestionUserAnswers.author_id.in_(user_ids))
+    return {user_id: _score(correct, total) for user_id, correct, total in db.session.execute(stmt)}
@@ -0,0 +1,307 @@
+import math
+import re
+from collections import namedtuple
+from difflib import SequenceMatcher
+import sqlalchemy as sa
+from markupsafe import Markup, escape
+from flask import current_app
+from app import db
+from app.cache import LRUCache
+from app.models import Subject, Topic, QuizQuestion
+
+# One row per subject, topic and question. The row id encodes the kind so a
+# document is found, replaced and deleted by its primary key:
+# rowid = ref_id * 4 + kind.
+KINDS = {"subject": 1, "topic": 2, "question": 3}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+QUESTION_FIELDS = ("question", "option1", "option2", "option3", "option4")
+_MARK_START, _MARK_END = "\x02", "\x03"
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+Result = namedtuple("Result", "kind ref_id subject_id quiz_id title snippet")
+Page = namedtuple("Page", "results page has_next")
+Duplicate = namedtuple("Duplicate", "question_id quiz_id subject_id question similarity")
+
+SQLITE_DDL = [
+    # The porter stemmer matches "capitals" to "capital"; title (name or
+    # question text) and body (description or options) are ranked separately
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "title, body, kind UNINDEXED, subject_id UNINDEXED, quiz_id UNINDEXED, "
+    "tokenize = 'porter unicode61 remove_diacritics 2')",
+]
+POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS search_document ("
+    "id BIGINT PRIMARY KEY, kind SMALLINT NOT NULL, subject_id INTEGER, quiz_id INTEGER, "
+    "title TEXT NOT NULL, body TEXT NOT NULL, "
+    "document TSVECTOR GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_search_document_document ON search_document USING GIN (document)",
+]
+
+
+def _words(text):
+    return _WORD.findall((text or "").lower())
+
+
+def _doc_id(kind, ref_id):
+    return ref_id * 4 + KINDS[kind]
+
+
+def _is_postgres(connection):
+    return connection.dialect.name == "postgresql"
+
+
+def _table(connection):
+    return "search_document" if _is_postgres(connection) else "search_index"
+
+
+# Writing documents
+
+
+def _delete(connection, doc_ids):
+    if doc_ids:
+        key = "id" if _is_postgres(connection) else "rowid"
+        connection.execute(
+            sa.text(f"DELETE FROM {_table(connection)} WHERE {key} IN :ids").bindparams(sa.bindparam("ids", expanding=True)),
+            {"ids": list(doc_ids)},
+        )
+
+
+def _insert(connection, docs):
+    # docs: dicts with id, kind, subject_id, quiz_id, title, body. A question's
+    # subject comes from its quiz, looked up by the statement itself
+    if not docs:
+        return
+    key = "id" if _is_postgres(connection) else "rowid"
+    connection.execute(sa.text(
+        f"INSERT INTO {_table(connection)} ({key}, kind, subject_id, quiz_id, title, body) "
+        "VALUES (:id, :kind, COALESCE(:subject_id, (SELECT subject_id FROM quiz WHERE id = :quiz_id)), :quiz_id, :title, :body)"
+    ), docs)
+
+
+def _subject_doc(subject):
+    return {"id": _doc_id("subject", subject.id), "kind": KINDS["subject"], "subject_id": subject.id,
+            "quiz_id": None, "title": subject.name or "", "body": subject.description or ""}
+
+
+def _topic_doc(topic):
+    return {"id": _doc_id("topic", topic.id), "kind": KINDS["topic"], "subject_id": topic.subject_id,
+            "quiz_id": None, "title": topic.name or "", "body": topic.description or ""}
+
+
+def _question_doc(question):
+    # question is a QuizQuestion or a dict with its columns
+    get = question.get if isinstance(question, dict) else lambda name: getattr(question, name)
+    return {"id": _doc_id("question", get("id")), "kind": KINDS["question"], "subject_id": None,
+            "quiz_id": get("quiz_id"), "title": get("question") or "",
+            "body": "\n".join(get(field) or "" for field in QUESTION_FIELDS[1:])}
+
+
+_DOCUMENTS = {
+    Subject: ("subject", _subject_doc, ("name", "description")),
+    Topic: ("topic", _topic_doc, ("name", "description", "subject_id")),
+    QuizQuestion: ("question", _question_doc, QUESTION_FIELDS + ("quiz_id",)),
+}
+
+
+def _changed(obj, fields):
+    state = sa.inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _after_flush(session, flush_context):
+    """Keep the index in step with ORM writes, in the same transaction."""
+    deleted, docs = set(), []
+    for obj in session.deleted:
+        entry = _DOCUMENTS.get(type(obj))
+        if entry is not None:
+            deleted.add(_doc_id(entry[0], obj.id))
+    for obj in list(session.new) + list(session.dirty):
+        entry = _DOCUMENTS.get(type(obj))
+        if entry is None or obj in session.deleted:
+            continue
+        kind, make_doc, fields = entry
+        if obj not in session.new and not _changed(obj, fields):
+            continue
+        deleted.add(_doc_id(kind, obj.id))
+        # Questions detached from their quiz are left out of the index
+        if kind != "question" or obj.quiz_id is not None:
+            docs.append(make_doc(obj))
+    if deleted or docs:
+        connection = session.connection()
+        _delete(connection, deleted)
+        _insert(connection, docs)
+
+
+sa.event.listen(db.session, "after_flush", _after_flush)
+
+
+def _create_index(target, connection, **kw):
+    # db.create_all() builds the index too; deployed databases get it from the migration
+    ddl = POSTGRES_DDL if _is_postgres(connection) else SQLITE_DDL if connection.dialect.name == "sqlite" else []
+    for statement in ddl:
+        connection.execute(sa.text(statement))
+
+
+sa.event.listen(db.metadata, "after_create", _create_index)
+
+
+def index_questions(rows):
+    """Index questions added with Core bulk inserts, which skip the ORM hook.
+
+    rows are dicts with the question's id, quiz_id and text columns.
+    """
+    connection = db.session.connection()
+    docs = [_question_doc(row) for row in rows]
+    _delete(connection, [doc["id"] for doc in docs])
+    _insert(connection, docs)
+
+
+def rebuild():
+    """Re-index every subject, topic and question; returns the number of documents."""
+    connection = db.session.connection()
+    connection.execute(sa.text(f"DELETE FROM {_table(connection)}"))
+    count = 0
+    for model, (kind, make_doc, _) in _DOCUMENTS.items():
+        stmt = sa.select(model).execution_options(yield_per=1000)
+        if model is QuizQuestion:
+            stmt = stmt.where(QuizQuestion.quiz_id.is_not(None))
+        for partition in db.session.scalars(stmt).partitions():
+            _insert(connection, [make_doc(obj) for obj in partition])
+            count += len(partition)
+    db.session.commit()
+    return count
+
+
+# Reading
+
+
+def _match_all(words):
+    # Every word must appear; the last one may be a prefix, for as-you-type search
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _match_any(words):
+    return "title : (" + " OR ".join(f'"{word}"' for word in words) + ")"
+
+
+def _highlight(snippet):
+    # Escape the stored text first, then turn the markers into <mark> tags
+    return Markup(str(escape(snippet)).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>"))
+
+
+def search(query, kinds=None, page=1, per_page=20):
+    """Ranked full-text search; a match in a name or question counts more than in the rest.
+
+    One extra row is fetched to tell whether there is a next page.
+    """
+    words = _words(query)
+    if not words:
+        return Page([], page, False)
+    kind_codes = [KINDS[kind] for kind in (kinds or KINDS)]
+    params = {"kinds": kind_codes, "limit": per_page + 1, "offset": (page - 1) * per_page}
+    connection = db.session.connection()
+    if _is_postgres(connection):
+        stmt = sa.text(
+            "SELECT kind, id / 4 AS ref_id, subject_id, quiz_id, title, "
+            "ts_headline('english', title || ' ' || body, websearch_to_tsquery('english', :query), "
+            "'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=20, MinWords=8') AS snippet "
+            "FROM search_document WHERE document @@ websearch_to_tsquery('english', :query) AND kind IN :kinds "
+            "ORDER BY ts_rank_cd(document, websearch_to_tsquery('english', :query)) DESC, id "
+            "LIMIT :limit OFFSET :offset"
+        )
+        params["query"] = " ".join(words)
+    else:
+        stmt = sa.text(
+            "SELECT kind, rowid / 4 AS ref_id, subject_id, quiz_id, title, "
+            "snippet(search_index, -1, char(2), char(3), '…', 16) AS snippet "
+            "FROM search_index WHERE search_index MATCH :query AND kind IN :kinds "
+            "ORDER BY bm25(search_index, 10.0, 1.0), rowid "
+            "LIMIT :limit OFFSET :offset"
+        )
+        params["query"] = _match_all(words)
+    rows = connection.execute(stmt.bindparams(sa.bindparam("kinds", expanding=True)), params).all()
+    results = [
+        Result(KIND_NAMES[row.kind], row.ref_id, row.subject_id, row.quiz_id, row.title, _highlight(row.snippet))
+        for row in rows[:per_page]
+    ]
+    return Page(results, page, len(rows) > per_page)
+
+
+def normalize(text):
+    return " ".join(_words(text))
+
+
+_frequencies = LRUCache(1024 * 1024, sizeof=lambda value: 64)  # word -> questions containing it
+
+
+def _document_frequency(connection, word):
+    # Used to pick cheap probes, so a stale count costs time, not results. Zero
+    # counts are not cached: they rule the word out
+    count = _frequencies.get(word)
+    if count is None:
+        if _is_postgres(connection):
+            stmt = sa.text("SELECT count(*) FROM search_document WHERE document @@ to_tsquery('english', :query)")
+            query = word
+        else:
+            stmt = sa.text("SELECT count(*) FROM search_index WHERE search_index MATCH :query")
+            query = f'title : "{word}"'
+        count = connection.execute(stmt, {"query": query}).scalar()
+        if count:
+            _frequencies.set(word, count)
+    return count
+
+
+def find_duplicates(question, threshold=None, candidates=10):
+    """Existing questions whose text is nearly the same as ``question``.
+
+    A question at least ``threshold`` similar must share most of its words, so
+    the index is probed only with as many of the rarest words as it takes to be
+    sure to hit it: a common word in the probe makes it scan a long posting
+    list. Only the best ranked matches are compared word by word.
+    """
+    threshold = threshold if threshold is not None else current_app.config['SEARCH_DUPLICATE_THRESHOLD']
+    words = _words(question)
+    if not words:
+        return []
+    connection = db.session.connection()
+    # A near-duplicate shares at least `needed` of the distinct words that are in
+    # the index, so it contains one of any len(present) - needed + 1 of them
+    distinct = set(words)
+    shared = math.ceil(threshold * len(words) / (2 - threshold))
+    needed = max(shared - (len(words) - len(distinct)), 1)
+    frequencies = {word: _document_frequency(connection, word) for word in distinct}
+    present = sorted((word for word in distinct if frequencies[word]), key=lambda word: (frequencies[word], word))
+    if len(present) < needed:
+        return []
+    probes = present[:len(present) - needed + 1]
+    if _is_postgres(connection):
+        stmt = sa.text(
+            "SELECT id / 4 AS ref_id, subject_id, quiz_id, title FROM search_document "
+            "WHERE kind = :kind AND document @@ to_tsquery('english', :query) "
+            "ORDER BY ts_rank(document, to_tsquery('english', :query)) DESC LIMIT :limit"
+        )
+        query = " | ".join(probes)
+    else:
+        stmt = sa.text(
+            "SELECT rowid / 4 AS ref_id, subject_id, quiz_id, title FROM search_index "
+            "WHERE search_index MATCH :query AND kind = :kind "
+            "ORDER BY bm25(search_index, 10.0, 1.0) LIMIT :limit"
+        )
+        query = _match_any(probes)
+    rows = connection.execute(stmt, {"query": query, "kind": KINDS["question"], "limit": candidates}).all()
+    # Compared word by word, so "12" and "15" differ as much as "cat" and "dog"
+    matcher = SequenceMatcher(autojunk=False)
+    matcher.set_seq2(words)
+    duplicates = []
+    for row in rows:
+        matcher.set_seq1(_words(row.title))
+        # The quick ratios are upper bounds, so most candidates are ruled out cheaply
+        if matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold:
+            ratio = matcher.ratio()
+            if ratio >= threshold:
+                duplicates.append(Duplicate(row.ref_id, row.quiz_id, row.subject_id, row.title, ratio))
+    return sorted(duplicates, key=lambda d: d.similarity, reverse=True)
+
@@ -0,0 +1,66 @@
+import time
+import sqlalchemy as sa
+from flask import url_for
+from flask_login import UserMixin
+from app import db, login
+from app import avatars
+from app.cache import LRUCache
+from app.models import User
+
+SESSION_USER_TTL = 60
+
+_users = LRUCache(4 * 1024 * 1024)
+
+
+def init_app(app):
+    global SESSION_USER_TTL
+    SESSION_USER_TTL = app.config.get('SESSION_USER_TTL', 60)
+    _users.max_bytes = app.config.get('SESSION_USER_CACHE_MAX_BYTES', 4 * 1024 * 1024)
+
+
+class SessionUser(UserMixin):
+    """Slim, detached snapshot of a User that backs current_user.
+
+    It carries only what requests and the base template read, so it can be
+    cached across requests without holding on to a database session.
+    """
+
+    __slots__ = ("id", "username", "email", "is_admin", "avatar")
+
+    def __init__(self, id, username, email, is_admin, avatar):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_admin = bool(is_admin)
+        self.avatar = avatar
+
+    def identicon_url(self, size=120):
+        avatars.ensure_identicon(self.email, size)
+        return url_for('identicon', digest=avatars.email_digest(self.email), size=size)
+
+    def __repr__(self):
+        return '<SessionUser {}>'.format(self.username)
+
+
+def _load(user_id):
+    row = db.session.execute(
+        sa.select(User.id, User.username, User.email, User.is_admin, User.avatar).where(User.id == user_id)
+    ).first()
+    return SessionUser(*row) if row else None
+
+
+@login.user_loader
+def load_user(id):
+    user_id = int(id)
+    entry = _users.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    user = _load(user_id)
+    if user is not None:
+        _users.set(user_id, (time.monotonic() + SESSION_USER_TTL, user))
+    return user
+
+
+def invalidate_user(user_id):
+    """Drop a cached snapshot after the user's row changes."""
+    _users.delete(user_id)
@@ -0,0 +1,73 @@
+import hashlib
+from itertools import permutations
+from flask import current_app
+
+OPTIONS = (1, 2, 3, 4)
+_LAYOUTS = list(permutations(OPTIONS))  # The 24 ways to lay out four options
+_keys = {}
+
+
+def _key(secret):
+    key = _keys.get(secret)
+    if key is None:
+        key = _keys[secret] = hashlib.blake2b(secret.encode(), digest_size=32).digest()
+    return key
+
+
+class Permutation:
+    """Question order and option layout of one candidate's attempt at a quiz.
+
+    Both come from a hash of (user id, quiz id, attempt id) keyed with the app's
+    secret, so they are recomputed on every request instead of being stored,
+    and neighbours can't work out each other's layout. Displayed numbers are
+    what the candidate sees and submits; canonical numbers are the
+    option1-option4 columns that answers are stored and scored against.
+    """
+
+    def __init__(self, user_id, quiz_id, attempt_id, secret, questions=True, options=True):
+        self.seed = f"{user_id}:{quiz_id}:{attempt_id}".encode()
+        self.key = _key(secret)
+        self.shuffle_questions = questions
+        self.shuffle_options = options
+
+    def _hash(self, kind, question_id):
+        digest = hashlib.blake2b(self.seed + f":{kind}:{question_id}".encode(), key=self.key, digest_size=8)
+        return int.from_bytes(digest.digest(), "big")
+
+    def order(self, question_ids):
+        """Return the question ids in this attempt's order.
+
+        Each question is ranked by its own hash, so adding a question to the quiz
+        doesn't reorder the others for candidates already taking it.
+        """
+        if not self.shuffle_questions:
+            return list(question_ids)
+        return sorted(question_ids, key=lambda question_id: (self._hash("q", question_id), question_id))
+
+    def options(self, question_id):
+        """Canonical option numbers in display order."""
+        if not self.shuffle_options:
+            return OPTIONS
+        return _LAYOUTS[self._hash("o", question_id) % len(_LAYOUTS)]
+
+    def to_canonical(self, question_id, displayed):
+        if displayed is None:
+            return None
+        return self.options(question_id)[displayed - 1]
+
+    def to_displayed(self, question_id, canonical):
+        if canonical is None:
+            return None
+        return self.options(question_id).index(canonical) + 1
+
+
+def for_attempt(user_id, quiz_id, attempt):
+    config = current_app.config
+    return Permutation(
+        user_id,
+        quiz_id,
+        attempt.id if attempt is not None else 0,
+        config['SECRET_KEY'],
+        questions=config.get('SHUFFLE_QUESTIONS', True),
+        options=config.get('SHUFFLE_OPTIONS', True),
+    )
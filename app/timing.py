@@ -0,0 +1,315 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
+from app import db
+from app.models import QuizAttempt, QuestionTimer, TestResult, QuizQuestion, QuizQuestionUserAnswers
+from app.answers import GRACE_SECONDS
+from app.answer_writer import answer_writer
+from app.quiz_content import get_quiz_content
+from app.scoring import Score, score_attempt, score_attempts, score_quiz, PASS_RATIO
+from app import leaderboard
+from app import monitoring
+from app import sampling
+from app import analytics
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def utcnow():
+    # Naive UTC, matching how DateTime columns are stored
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def epoch(moment):
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _question_limit(content):
+    # Quiz.duration is the time allowed per question, in minutes
+    return timedelta(minutes=content["duration"])
+
+
+def current_attempt(user_id, quiz_id):
+    return db.session.scalar(
+        sa.select(QuizAttempt)
+        .where(QuizAttempt.user_id == user_id, QuizAttempt.quiz_id == quiz_id, QuizAttempt.submitted_at.is_(None))
+        .order_by(QuizAttempt.id.desc())
+        .limit(1)
+    )
+
+
+def start_attempt(user_id, quiz_id, now=None):
+    """Return the user's open attempt at a quiz, starting one if there is none.
+
+    Quizzes with a sample_size draw that many questions from their bank for the
+    attempt. An attempt may run for the per-question limit times the number of
+    questions it serves. Answers are stored per user and question, so a new
+    attempt clears the ones left by the user's previous attempt at the quiz:
+    a retake is scored on its own answers only.
+    """
+    attempt = current_attempt(user_id, quiz_id)
+    if attempt is not None:
+        return attempt
+    answer_writer.flush()  # Buffered answers of the previous attempt must not land after the clear
+    cleared = db.session.execute(
+        sa.delete(QuizQuestionUserAnswers).where(
+            QuizQuestionUserAnswers.author_id == user_id,
+            QuizQuestionUserAnswers.question_id.in_(sa.select(QuizQuestion.id).where(QuizQuestion.quiz_id == quiz_id)),
+        )
+    ).rowcount
+    content = get_quiz_content(quiz_id)
+    drawn = sampling.draw(quiz_id, content["sample_size"]) if content["sample_size"] else None
+    question_count = len(drawn) if drawn is not None else len(content["questions"])
+    now = now or utcnow()
+    attempt = QuizAttempt(
+        user_id=user_id,
+        quiz_id=quiz_id,
+        started_at=now,
+        deadline_at=now + _question_limit(content) * max(question_count, 1),
+    )
+    db.session.add(attempt)
+    if drawn is not None:
+        db.session.flush()
+        sampling.record_draw(attempt.id, drawn)
+    db.session.commit()
+    if cleared:
+        analytics.answers_changed(quiz_ids=[quiz_id])
+    monitoring.attempt_started(quiz_id, user_id)
+    _start_sweeper()
+    return attempt
+
+
+def question_timer(attempt, question_id, now=None):
+    """Return the timer of a question, starting it when the question is first served."""
+    stmt = sa.select(QuestionTimer).where(QuestionTimer.attempt_id == attempt.id, QuestionTimer.question_id == question_id)
+    timer = db.session.scalar(stmt)
+    if timer is not None:
+        return timer
+    now = now or utcnow()
+    timer = QuestionTimer(
+        attempt_id=attempt.id,
+        question_id=question_id,
+        started_at=now,
+        deadline_at=min(now + _question_limit(get_quiz_content(attempt.quiz_id)), attempt.deadline_at),
+    )
+    db.session.add(timer)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The same question was opened concurrently, e.g. in two tabs
+        db.session.rollback()
+        timer = db.session.scalar(stmt)
+    return timer
+
+
+def chained_deadlines(attempt, order, answered, now=None):
+    """Start and return the timers of questions answered one after another on a single page.
+
+    The whole quiz is served at once, so the server can't see a question being
+    opened. Instead the first question's timer starts with the attempt and each
+    later one when the answer to the previous question reached the server, or
+    when the previous timer ran out without one. ``order`` is the attempt's
+    question ids as served and ``answered`` the ids answered by this request.
+    Returns {question id: deadline} for every question opened so far.
+    """
+    now = now or utcnow()
+    limit = _question_limit(get_quiz_content(attempt.quiz_id))
+    timers = {
+        timer.question_id: timer
+        for timer in db.session.scalars(sa.select(QuestionTimer).where(QuestionTimer.attempt_id == attempt.id))
+    }
+    deadlines = {}
+    opens_at = attempt.started_at
+    for question_id in order:
+        timer = timers.get(question_id)
+        if timer is None:
+            if opens_at > now:
+                break  # The candidate is still on an earlier question
+            timer = QuestionTimer(
+                attempt_id=attempt.id,
+                question_id=question_id,
+                started_at=opens_at,
+                deadline_at=min(opens_at + limit, attempt.deadline_at),
+            )
+            db.session.add(timer)
+        deadlines[question_id] = timer.deadline_at
+        opens_at = min(now, timer.deadline_at) if question_id in answered else timer.deadline_at
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request of the same attempt started these timers first
+        db.session.rollback()
+        return chained_deadlines(attempt, order, answered, now)
+    return deadlines
+
+
+def seconds_left(timer, now=None):
+    return max((timer.deadline_at - (now or utcnow())).total_seconds(), 0.0)
+
+
+def is_late(deadline_at, now=None):
+    # GRACE_SECONDS covers the request that the browser sends as its countdown hits zero
+    return (now or utcnow()) > deadline_at + timedelta(seconds=GRACE_SECONDS)
+
+
+def _claim(attempt_ids, now):
+    # Mark attempts submitted; only rows still open are returned, so a manual
+    # submit and the sweeper (in any process) never both score one attempt
+    return db.session.execute(
+        sa.update(QuizAttempt)
+        .where(QuizAttempt.id.in_(attempt_ids), QuizAttempt.submitted_at.is_(None))
+        .values(submitted_at=now)
+        .returning(QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.quiz_id, QuizAttempt.started_at, QuizAttempt.deadline_at)
+    ).all()
+
+
+def last_result(user_id, quiz_id):
+    # The TestResult of the user's latest submitted attempt at a quiz, if it has one yet
+    test_result_id = db.session.scalar(
+        sa.select(QuizAttempt.test_result_id)
+        .where(QuizAttempt.user_id == user_id, QuizAttempt.quiz_id == quiz_id, QuizAttempt.submitted_at.is_not(None))
+        .order_by(QuizAttempt.id.desc())
+        .limit(1)
+    )
+    return db.session.get(TestResult, test_result_id) if test_result_id is not None else None
+
+
+def finish_attempt(user_id, quiz_id, now=None):
+    """Score the user's open attempt and store its TestResult.
+
+    time_taken runs from the start of the attempt to now, capped at its deadline.
+    A TestResult is only written for an attempt claimed here: with no open
+    attempt (already submitted, by the user or the sweeper) the latest
+    attempt's TestResult is returned, or None if there is none.
+    Buffered answers must be flushed first.
+    """
+    now = now or utcnow()
+    attempt = current_attempt(user_id, quiz_id)
+    if attempt is None:
+        return last_result(user_id, quiz_id)
+    if not _claim([attempt.id], now):
+        # Submitted since it was read; the claim waits for the other
+        # transaction, which stores the TestResult along with the claim
+        db.session.rollback()
+        return last_result(user_id, quiz_id)
+    time_taken = (min(now, attempt.deadline_at) - attempt.started_at).total_seconds()
+
+    question_ids = sampling.attempt_questions(attempt, get_quiz_content(quiz_id))
+    score, total_questions, is_passed = score_attempt(user_id, quiz_id, question_ids)
+    test_result = TestResult(
+        user_id=user_id,
+        quiz_id=quiz_id,
+        score=score,
+        total_questions=total_questions,
+        time_taken=time_taken,
+        is_passed=is_passed,
+    )
+    db.session.add(test_result)
+    db.session.flush()
+    attempt.test_result_id = test_result.id
+    db.session.commit()
+    monitoring.attempt_submitted(quiz_id, user_id, test_result.id)
+    return test_result
+
+
+def sweep_abandoned(now=None, batch_size=200):
+    """Auto-submit attempts whose deadline passed without the candidate submitting.
+
+    Attempts are claimed and scored in batches: one scoring query per quiz and
+    one multi-row insert of TestResults per batch. Returns the number submitted.
+    """
+    now = now or utcnow()
+    cutoff = now - timedelta(seconds=GRACE_SECONDS)
+    submitted = 0
+    answer_writer.flush()
+    while True:
+        attempt_ids = db.session.scalars(
+            sa.select(QuizAttempt.id)
+            .where(QuizAttempt.submitted_at.is_(None), QuizAttempt.deadline_at < cutoff)
+            .order_by(QuizAttempt.deadline_at)
+            .limit(batch_size)
+        ).all()
+        if not attempt_ids:
+            return submitted
+        claimed = _claim(attempt_ids, now)
+        if not claimed:
+            db.session.commit()
+            continue
+
+        by_quiz = defaultdict(list)
+        for row in claimed:
+            by_quiz[row.quiz_id].append(row)
+        results, attempts, result_quiz_ids = [], [], []
+        for quiz_id, rows in by_quiz.items():
+            content = get_quiz_content(quiz_id)
+            # Sampled attempts are scored on their own draw, the rest on the whole quiz
+            drawn_scores = score_attempts([row.id for row in rows]) if content and content["sample_size"] else {}
+            user_ids = [row.user_id for row in rows if row.id not in drawn_scores]
+            scores = score_quiz(quiz_id, user_ids=user_ids) if user_ids else {}
+            total = len(content["questions"]) if content else 0
+            for row in rows:
+                # Candidates who never answered get a zero score
+                score = drawn_scores.get(row.id) or scores.get(row.user_id) or Score(0, total, 0 >= total * PASS_RATIO)
+                results.append({
+                    "user_id": row.user_id,
+                    "quiz_id": quiz_id,
+                    "score": score.score,
+                    "total_questions": score.total_questions,
+                    "time_taken": (row.deadline_at - row.started_at).total_seconds(),
+                    "is_passed": score.is_passed,
+                })
+                attempts.append(row.id)
+                result_quiz_ids.append(quiz_id)
+
+        result_ids = db.session.scalars(
+            sa.insert(TestResult).returning(TestResult.id, sort_by_parameter_order=True), results
+        ).all()
+        db.session.execute(sa.update(QuizAttempt), [
+            {"id": attempt_id, "test_result_id": result_id, "auto_submitted": True}
+            for attempt_id, result_id in zip(attempts, result_ids)
+        ])
+        db.session.commit()
+        submitted += len(result_ids)
+        analytics.answers_changed(quiz_ids=by_quiz)
+
+        for quiz_id, result, result_id in zip(result_quiz_ids, results, result_ids):
+            monitoring.attempt_submitted(quiz_id, result["user_id"], result_id)
+        last_results = dict(zip(result_quiz_ids, result_ids))  # Latest new result per quiz
+        for quiz_id, result_id in last_results.items():
+            content = get_quiz_content(quiz_id)
+            if content:
+                leaderboard.record_result(db.session.get(TestResult, result_id), content["subject_id"])
+
+
+def _run_sweeper(app, interval, batch_size):
+    while True:
+        time.sleep(interval)
+        try:
+            with app.app_context():
+                count = sweep_abandoned(batch_size=batch_size)
+            if count:
+                app.logger.info(f"Auto-submitted {count} abandoned quiz attempts")
+        except Exception:
+            app.logger.exception("Sweeping abandoned quiz attempts failed")
+
+
+def _start_sweeper():
+    global _sweeper
+    app = current_app._get_current_object()
+    interval = app.config.get('ATTEMPT_SWEEP_INTERVAL', 30)
+    if not interval:
+        return
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = threading.Thread(
+                target=_run_sweeper,
+                args=(app, interval, app.config.get('ATTEMPT_SWEEP_BATCH', 200)),
+                name="attempt-sweeper",
+                daemon=True,
+            )
+            _sweeper.start()
@@ -0,0 +1,97 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app import db
+from app.models import User
+from app.sessions import invalidate_user
+
+AVATAR_FORMAT = "webp"
+
+_executor = None
+_latest = {}  # user id -> content hash of the most recent upload
+_lock = threading.Lock()
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def init_app(app):
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=app.config.get('AVATAR_WORKERS', 2), thread_name_prefix="avatar")
+
+
+def avatar_filename(content_hash, size):
+    return f"{content_hash}-{size}.{AVATAR_FORMAT}"
+
+
+def make_thumbnail(data, size):
+    """Center-crop an image to a size x size WebP thumbnail."""
+    from PIL import Image, ImageOps  # Pillow is only loaded once someone uploads an avatar
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = ImageOps.fit(image.convert("RGB"), (size, size), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format=AVATAR_FORMAT, quality=80, method=4)
+        return output.getvalue()
+
+
+def _process(app, user_id, content_hash, data, size):
+    filename = avatar_filename(content_hash, size)
+    folder = app.config['UPLOAD_FOLDER']
+    path = os.path.join(folder, filename)
+    # Identical uploads hash to the same file, so the thumbnail is only made once
+    if not os.path.exists(path):
+        thumbnail = make_thumbnail(data, size)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(thumbnail)
+        os.replace(tmp_path, path)
+
+    with _lock:
+        if _latest.get(user_id) != content_hash:
+            return None  # A newer upload for this user superseded this one
+        del _latest[user_id]
+
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user.avatar = f'images/avatars/{filename}'
+            db.session.commit()
+            invalidate_user(user_id)
+    return filename
+
+
+def _run(app, user_id, content_hash, data, size):
+    try:
+        return _process(app, user_id, content_hash, data, size)
+    except Exception:
+        app.logger.exception(f"Processing avatar upload for user {user_id} failed")
+        raise
+
+
+def submit_avatar(user_id, data):
+    """Validate an uploaded image and queue it for thumbnailing.
+
+    The header check runs in the request so bad files are reported right away.
+    Decoding, resizing and the User.avatar update happen on the worker pool.
+    Returns a Future resolving to the stored filename.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+    except Exception:
+        raise InvalidImageError("The uploaded file is not a valid image.")
+
+    content_hash = hashlib.sha256(data).hexdigest()
+    with _lock:
+        _latest[user_id] = content_hash
+    app = current_app._get_current_object()
+    return _executor.submit(_run, app, user_id, content_hash, data, app.config.get('AVATAR_SIZE', 128))
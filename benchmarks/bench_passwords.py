@@ -0,0 +1,52 @@
+"""Measure password checks (logins) per second per core for each hashing setting.
+
+Pick PASSWORD_HASH_METHOD so the expected login burst fits the CPUs of the
+server, e.g. 2000 candidates in a minute on 4 cores need ~9 logins/s/core.
+
+Run from the project root: python benchmarks/bench_passwords.py [method ...]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+METHODS = [
+    "scrypt",  # werkzeug default, scrypt:32768:8:1
+    "scrypt:16384:8:1",
+    "scrypt:8192:8:1",
+    "pbkdf2:sha256",  # werkzeug default iterations
+    "pbkdf2:sha256:600000",
+    "pbkdf2:sha256:210000",
+]
+DURATION = 2.0  # Seconds spent measuring each setting
+
+
+def logins_per_second(pwhash, workers):
+    def worker(deadline):
+        count = 0
+        while time.perf_counter() < deadline:
+            check_password_hash(pwhash, "correct horse battery staple")
+            count += 1
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        counts = list(pool.map(worker, [start + DURATION] * workers))
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main():
+    methods = sys.argv[1:] or METHODS
+    cores = os.cpu_count() or 1
+    print(f"{cores} core(s), {DURATION:.0f}s per setting")
+    print(f"{'method':<24} {'stored as':<26} {'1 thread/s':>11} {f'{cores} threads/s':>13} {'per core/s':>11}")
+    for method in methods:
+        pwhash = generate_password_hash("correct horse battery staple", method=method)
+        single = logins_per_second(pwhash, 1)
+        parallel = logins_per_second(pwhash, cores) if cores > 1 else single
+        print(f"{method:<24} {pwhash.split('$', 1)[0]:<26} {single:>11.1f} {parallel:>13.1f} {parallel / cores:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
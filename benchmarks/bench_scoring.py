@@ -0,0 +1,98 @@
+"""Compare query counts of per-question scoring against the aggregate scoring engine.
+
+Run from the project root: python benchmarks/bench_scoring.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+from app import create_app, db
+from app.models import User, Subject, Quiz, QuizQuestion, QuizQuestionAnswer, QuizQuestionUserAnswers
+from app.enums import QuestionAnswerEnum, QuizStatusEnum
+from app.scoring import score_attempt, score_quiz
+
+QUESTION_COUNTS = [10, 100, 1000]
+USERS = 20
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        sa.event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        sa.event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def seed(question_count):
+    db.drop_all()
+    db.create_all()
+    users = [User(username=f"user{i}", email=f"user{i}@example.com", phone=str(i)) for i in range(USERS)]
+    subject = Subject(name="Benchmark")
+    db.session.add_all(users + [subject])
+    db.session.flush()
+    quiz = Quiz(subject_id=subject.id, status=QuizStatusEnum.FROZEN)
+    db.session.add(quiz)
+    db.session.flush()
+    questions = [
+        QuizQuestion(question=f"Q{i}", option1="a", option2="b", option3="c", option4="d", quiz_id=quiz.id)
+        for i in range(question_count)
+    ]
+    db.session.add_all(questions)
+    db.session.flush()
+    for i, question in enumerate(questions):
+        db.session.add(QuizQuestionAnswer(question_id=question.id, option=QuestionAnswerEnum(i % 4 + 1)))
+        for user in users:
+            db.session.add(QuizQuestionUserAnswers(question_id=question.id, author_id=user.id, answer=(i * user.id) % 4 + 1))
+    db.session.commit()
+    return users[0].id, quiz.id
+
+
+def legacy_score(user_id, quiz_id):
+    # The per-question loop that calculate_score used to run
+    quiz = db.session.get(Quiz, quiz_id)
+    correct_answers = 0
+    for question in quiz.questions:
+        user_answer = QuizQuestionUserAnswers.query.filter_by(author_id=user_id, question_id=question.id).first()
+        if user_answer and user_answer.answer == question.answer.option.value:
+            correct_answers += 1
+    total_questions = len(quiz.questions)
+    return correct_answers, total_questions, correct_answers >= total_questions / 2
+
+
+def measure(func, *args):
+    db.session.expire_all()
+    with QueryCounter(db.engine) as counter:
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+    return result, counter.count, elapsed
+
+
+def main():
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://"})  # Throwaway in-memory database
+    print(f"{'questions':>10} {'method':>14} {'queries':>8} {'ms':>9}")
+    with app.app_context():
+        for question_count in QUESTION_COUNTS:
+            user_id, quiz_id = seed(question_count)
+            legacy, legacy_queries, legacy_time = measure(legacy_score, user_id, quiz_id)
+            single, single_queries, single_time = measure(score_attempt, user_id, quiz_id)
+            batch, batch_queries, batch_time = measure(score_quiz, quiz_id)
+            assert tuple(single) == legacy == tuple(batch[user_id])
+            print(f"{question_count:>10} {'legacy':>14} {legacy_queries:>8} {legacy_time * 1000:>9.2f}")
+            print(f"{question_count:>10} {'score_attempt':>14} {single_queries:>8} {single_time * 1000:>9.2f}")
+            print(f"{question_count:>10} {'score_quiz':>14} {batch_queries:>8} {batch_time * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measure cold start: package import, create_app() and the first request.
+
+Each run is a fresh interpreter, as for a new worker, CLI command or test
+session. The script also checks that the modules only some features need
+(alembic, numpy, PIL, pydenticon) are still not imported by then, and exits
+with status 1 if one is.
+
+Run from the project root: python benchmarks/bench_startup.py [--runs 10] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ["alembic", "flask_migrate", "numpy", "PIL", "pydenticon"]
+PHASES = ["import", "create_app", "first_request", "total"]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://"})
+created = time.perf_counter()
+status = application.test_client().get("/login").status_code
+served = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "first_request": served - created,
+    "total": served - start,
+    "status": status,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def run_once():
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time (default 5)")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    report = {
+        phase: {
+            "median_ms": round(1000 * statistics.median(run[phase] for run in runs), 1),
+            "min_ms": round(1000 * min(run[phase] for run in runs), 1),
+        }
+        for phase in PHASES
+    }
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+    report["loaded_lazy_modules"] = loaded
+
+    print(f"{args.runs} runs")
+    print(f"{'phase':<14} {'median ms':>10} {'min ms':>8}")
+    for phase in PHASES:
+        print(f"{phase:<14} {report[phase]['median_ms']:>10} {report[phase]['min_ms']:>8}")
+    if any(run["status"] != 200 for run in runs):
+        print("First request did not return 200")
+    if loaded:
+        print(f"Imported at startup but should be lazy: {', '.join(loaded)}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if loaded or any(run["status"] != 200 for run in runs) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
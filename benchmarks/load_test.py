@@ -0,0 +1,333 @@
+"""Simulate an exam cohort taking a quiz and report capacity figures.
+
+Seeds a throwaway SQLite database with one subject, one quiz and its questions.
+Then N candidates each run login -> start_quiz -> question (GET, POST) ->
+next_question ... -> submit_quiz (POST) -> view_test_result, pausing a random think
+time between pages. Candidates run on the Flask test client by default. With
+--server they go through a local waitress server over HTTP instead.
+
+The report has throughput, p50/p95/p99 latency per route and database queries
+per route. It is written as JSON (by default to benchmarks/results/) so runs
+on different commits can be compared.
+
+Run from the project root: python benchmarks/load_test.py --candidates 200 --questions 20
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "load-test-password"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--candidates", type=int, default=50, help="simulated candidates (default 50)")
+    parser.add_argument("--questions", type=int, default=10, help="questions in the quiz (default 10)")
+    parser.add_argument("--concurrency", type=int, default=0, help="candidates active at once (default all)")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds between pages (default 0.5)")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which candidates arrive (default 5)")
+    parser.add_argument("--server", action="store_true", help="drive a local waitress server over HTTP")
+    parser.add_argument("--hash-method", help="PASSWORD_HASH_METHOD for the run, e.g. pbkdf2:sha256:1000")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for answers and think times")
+    parser.add_argument("--output", help="JSON report path (default benchmarks/results/load_<time>_<commit>.json)")
+    return parser.parse_args()
+
+
+def seed(db, candidates, question_count):
+    from werkzeug.security import generate_password_hash
+    from app import passwords
+    from app.models import User, Subject, Quiz, QuizQuestion, QuizQuestionAnswer
+    from app.enums import QuestionAnswerEnum, QuizStatusEnum
+
+    db.create_all()
+    # Every candidate shares one password hash so seeding stays fast with costly settings
+    password_hash = generate_password_hash(PASSWORD, method=passwords.hash_method())
+    db.session.add_all([
+        User(username=f"candidate{i}", email=f"candidate{i}@example.com", phone=f"{i:010d}", password_hash=password_hash)
+        for i in range(candidates)
+    ])
+    subject = Subject(name="Load test")
+    db.session.add(subject)
+    db.session.flush()
+    quiz = Quiz(subject_id=subject.id, status=QuizStatusEnum.FROZEN)
+    db.session.add(quiz)
+    db.session.flush()
+    questions = [
+        QuizQuestion(question=f"Question {i + 1}", option1="a", option2="b", option3="c", option4="d",
+                     position=i + 1, quiz_id=quiz.id)
+        for i in range(question_count)
+    ]
+    db.session.add_all(questions)
+    db.session.flush()
+    db.session.add_all([
+        QuizQuestionAnswer(question_id=question.id, option=QuestionAnswerEnum(i % 4 + 1))
+        for i, question in enumerate(questions)
+    ])
+    db.session.commit()
+    return subject.id, quiz.id
+
+
+class QueryCounter:
+    """Counts SQL statements and requests per Flask endpoint on the server side."""
+
+    def __init__(self, app, engine):
+        from flask import request, has_request_context, request_started
+        self.queries = Counter()
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+        def endpoint():
+            if not has_request_context():
+                return "(background)"  # e.g. the answer writer's flush thread
+            return request.endpoint or "(unmatched)"
+
+        def on_execute(*args):
+            key = endpoint()
+            with self._lock:
+                self.queries[key] += 1
+
+        def on_request(sender, **extra):
+            key = endpoint()
+            with self._lock:
+                self.requests[key] += 1
+
+        import sqlalchemy as sa
+        sa.event.listen(engine, "before_cursor_execute", on_execute)
+        request_started.connect(on_request, app, weak=False)
+
+    def report(self):
+        return {
+            endpoint: {
+                "requests": self.requests[endpoint],
+                "queries": self.queries[endpoint],
+                "queries_per_request": round(self.queries[endpoint] / self.requests[endpoint], 2) if self.requests[endpoint] else None,
+            }
+            for endpoint in sorted(set(self.queries) | set(self.requests))
+        }
+
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code, response.headers.get("Location")
+
+
+class HTTPSession:
+    """Minimal keep-alive HTTP client that keeps cookies and does not follow redirects."""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        self.cookies = {}
+
+    def request(self, method, path, data=None):
+        headers = {}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            name, _, rest = header.partition("=")
+            self.cookies[name.strip()] = rest.split(";", 1)[0]
+        return response.status, response.getheader("Location")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.retries = Counter()
+        self._lock = threading.Lock()
+
+    def call(self, session, name, method, path, data=None, expect=(200, 302)):
+        while True:
+            start = time.perf_counter()
+            try:
+                status, location = session.request(method, path, data)
+            except Exception:
+                status, location = None, None
+            elapsed = time.perf_counter() - start
+            if status != 503:
+                break
+            # Busy (e.g. the password hashing pool is full): retry about a second
+            # later, as the response's Retry-After asks
+            with self._lock:
+                self.retries[name] += 1
+            time.sleep(random.uniform(0.5, 1.5))
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            if status not in expect:
+                self.errors[name] += 1
+        if status not in expect:
+            raise RuntimeError(f"{method} {path} returned {status}")
+        return urlsplit(location).path if location else None
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def run_candidate(number, make_session, recorder, subject_id, quiz_id, think_time, start_delay, rng_seed):
+    rng = random.Random(rng_seed)
+    time.sleep(start_delay)
+
+    def think():
+        if think_time > 0:
+            time.sleep(rng.expovariate(1 / think_time))
+
+    session = make_session()
+    recorder.call(session, "POST login", "POST", "/login",
+                  {"username": f"candidate{number}", "password": PASSWORD})
+    think()
+    location = recorder.call(session, "GET start_quiz", "GET", f"/subjects/{subject_id}/tests/{quiz_id}/start")
+    while location and "/question/" in location:
+        recorder.call(session, "GET question", "GET", location)
+        think()
+        next_location = recorder.call(session, "POST question", "POST", location, {"answer": str(rng.randint(1, 4))})
+        location = recorder.call(session, "GET next_question", "GET", next_location)
+    location = recorder.call(session, "POST submit_quiz", "POST", f"/submit_quiz/{quiz_id}", {})
+    recorder.call(session, "GET view_test_result", "GET", location, expect=(200,))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = parse_args()
+    tmp = tempfile.mkdtemp(prefix="quizz-load-")
+    config = {
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "load.db"),
+        "WTF_CSRF_ENABLED": False,  # The simulated browser does not parse forms for tokens
+    }
+    if args.hash_method:
+        config["PASSWORD_HASH_METHOD"] = args.hash_method
+    sys.path.insert(0, ROOT)
+
+    from app import create_app, db
+    from app.answer_writer import answer_writer
+    app = create_app(config)
+
+    with app.app_context():
+        subject_id, quiz_id = seed(db, args.candidates, args.questions)
+        counter = QueryCounter(app, db.engine)
+
+    server = None
+    if args.server:
+        from waitress import create_server
+        server = create_server(app, host="127.0.0.1", port=0, threads=app.config['WSGI_THREADS'])
+        threading.Thread(target=server.run, daemon=True).start()
+        make_session = lambda: HTTPSession(server.effective_port)
+    else:
+        make_session = lambda: TestClientSession(app)
+
+    recorder = Recorder()
+    concurrency = args.concurrency or args.candidates
+    failed = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(run_candidate, i, make_session, recorder, subject_id, quiz_id, args.think_time,
+                        args.ramp_up * i / args.candidates if i < concurrency else 0, args.seed * 100003 + i)
+            for i in range(args.candidates)
+        ]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"candidate failed: {e}", file=sys.stderr)
+    wall_time = time.perf_counter() - start
+    answer_writer.flush()
+    if server is not None:
+        server.close()
+
+    routes = {}
+    for name, values in sorted(recorder.latencies.items()):
+        values.sort()
+        routes[name] = {
+            "requests": len(values),
+            "errors": recorder.errors[name],
+            "busy_retries": recorder.retries[name],
+            "mean_ms": round(1000 * sum(values) / len(values), 2),
+            "p50_ms": round(1000 * percentile(values, 0.50), 2),
+            "p95_ms": round(1000 * percentile(values, 0.95), 2),
+            "p99_ms": round(1000 * percentile(values, 0.99), 2),
+            "max_ms": round(1000 * values[-1], 2),
+        }
+    total_requests = sum(route["requests"] for route in routes.values())
+    report = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "mode": "http" if args.server else "test_client",
+        "parameters": {
+            "candidates": args.candidates,
+            "questions": args.questions,
+            "concurrency": concurrency,
+            "think_time": args.think_time,
+            "ramp_up": args.ramp_up,
+            "hash_method": app.config['PASSWORD_HASH_METHOD'],
+            "cpu_count": os.cpu_count(),
+        },
+        "wall_time_s": round(wall_time, 3),
+        "throughput": {
+            "requests_per_s": round(total_requests / wall_time, 2),
+            "candidates_per_s": round((args.candidates - failed) / wall_time, 3),
+        },
+        "candidates_failed": failed,
+        "routes": routes,
+        "queries": counter.report(),
+    }
+
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results",
+        f"load_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{report['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{args.candidates} candidates x {args.questions} questions in {wall_time:.1f}s "
+          f"({report['throughput']['requests_per_s']} req/s, {failed} failed)")
+    print(f"{'route':<22} {'requests':>8} {'errors':>6} {'503s':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, route in routes.items():
+        print(f"{name:<22} {route['requests']:>8} {route['errors']:>6} {route['busy_retries']:>6} "
+              f"{route['p50_ms']:>8} {route['p95_ms']:>8} {route['p99_ms']:>8}")
+    print(f"{'endpoint':<22} {'queries/request':>15}")
+    for endpoint, row in report["queries"].items():
+        print(f"{endpoint:<22} {row['queries_per_request'] if row['queries_per_request'] is not None else row['queries']:>15}")
+    print(f"Report written to {output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Check that the SELECTs issued by the hot quiz-taking and listing routes use indexes.
+
+Drives each route through the Flask test client against a seeded in-memory
+database, runs EXPLAIN QUERY PLAN on every SELECT it issued and exits with a
+non-zero status if any of them scans a whole table. The app runs with
+LAZY_LOAD_GUARD='raise', so a relationship lazy-loading while a template
+renders (an N+1 regression) fails the check too.
+
+Run from the project root: python benchmarks/query_plans.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+from app import create_app, db
+from app.models import User, Subject, Quiz, QuizQuestion, QuizQuestionAnswer, QuizQuestionUserAnswers, TestResult
+from app.enums import QuestionAnswerEnum, QuizStatusEnum
+from app.answer_writer import answer_writer
+from app.queries import LazyLoadError
+
+QUESTIONS = 50
+USERS = 50
+
+
+def seed():
+    db.create_all()
+    users = [User(username=f"user{i}", email=f"user{i}@example.com", phone=str(i)) for i in range(USERS)]
+    for user in users:
+        user.password_hash = "x"
+    subjects = [Subject(name=f"Subject {i}") for i in range(5)]
+    db.session.add_all(users + subjects)
+    db.session.flush()
+    quizzes = [Quiz(subject_id=subject.id, status=status) for subject in subjects for status in QuizStatusEnum]
+    db.session.add_all(quizzes)
+    db.session.flush()
+    for quiz in quizzes:
+        for i in range(QUESTIONS):
+            question = QuizQuestion(question=f"Q{i}", option1="a", option2="b", option3="c", option4="d",
+                                    position=i + 1, quiz_id=quiz.id)
+            db.session.add(question)
+            db.session.flush()
+            db.session.add(QuizQuestionAnswer(question_id=question.id, option=QuestionAnswerEnum(i % 4 + 1)))
+            for user in users[1:11]:
+                db.session.add(QuizQuestionUserAnswers(question_id=question.id, author_id=user.id, answer=1))
+        for user in users[:10]:
+            db.session.add(TestResult(user_id=user.id, quiz_id=quiz.id, score=1, total_questions=QUESTIONS, time_taken=1.0))
+    db.session.commit()
+    db.session.execute(sa.text("ANALYZE"))
+    return users[0], subjects[0], quizzes[1]
+
+
+def capture(statements):
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.append((statement, parameters))
+    return on_execute
+
+
+def full_scans(statement, parameters):
+    plan = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    details = [row[3] for row in plan]
+    # An unfiltered scan in index order that stops at LIMIT is the first page of
+    # a keyset-paginated listing and reads only that page
+    if " LIMIT " in statement and " WHERE " not in statement and not any("TEMP B-TREE" in d for d in details):
+        return []
+    # "SCAN <table>" without an index reads every row; scans of subqueries and
+    # temp b-trees for ORDER BY/DISTINCT are fine
+    return [detail for detail in details if detail.startswith("SCAN ") and "INDEX" not in detail
+            and not detail.startswith("SCAN CONSTANT ROW")]
+
+
+def main():
+    # Throwaway in-memory database
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "WTF_CSRF_ENABLED": False, "TESTING": True,
+                      "LAZY_LOAD_GUARD": "raise"})
+    with app.app_context():
+        user, subject, quiz = seed()
+        user_id, subject_id, quiz_id = user.id, subject.id, quiz.id
+        question_id = db.session.scalar(sa.select(QuizQuestion.id).where(QuizQuestion.quiz_id == quiz_id).limit(1))
+        result_id = db.session.scalar(sa.select(TestResult.id).where(TestResult.user_id == user_id).limit(1))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+
+    question_url = f"/subjects/{subject_id}/tests/{quiz_id}/question/{question_id}"
+    routes = [
+        ("subjects", "GET", "/subjects", None),
+        ("view_subject", "GET", f"/subjects/{subject_id}", None),
+        ("view_quiz", "GET", f"/subject/{subject_id}/quizzes/{quiz_id}", None),
+        ("start_quiz", "GET", f"/subjects/{subject_id}/tests/{quiz_id}/start", None),
+        ("question", "GET", question_url, None),
+        ("question", "POST", question_url, {"answer": "2", "frozen": ""}),
+        ("next_question", "GET", question_url + "/next", None),
+        ("submit_quiz", "POST", f"/submit_quiz/{quiz_id}", {}),
+        ("view_test_result", "GET", f"/test_result/{result_id}", None),
+        ("result_history", "GET", "/results", None),
+        ("quiz_leaderboard", "GET", f"/subject/{subject_id}/quizzes/{quiz_id}/leaderboard", None),
+    ]
+
+    failures = 0
+    with app.app_context():
+        for name, method, url, data in routes:
+            statements = []
+            listener = capture(statements)
+            sa.event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                response = client.open(url, method=method, data=data)
+                if name == "question" and method == "POST":
+                    answer_writer.flush()
+            except LazyLoadError as e:
+                failures += 1
+                print(f"FAIL {method} {name}: {e}")
+                continue
+            finally:
+                sa.event.remove(db.engine, "before_cursor_execute", listener)
+
+            for statement, parameters in statements:
+                scans = full_scans(statement, parameters)
+                if scans:
+                    failures += 1
+                    print(f"FAIL {method} {name}: {', '.join(scans)}\n    {' '.join(statement.split())}")
+            print(f"{'ok' if response.status_code < 400 else response.status_code:>4} {method:<4} {name:<18} {len(statements)} SELECTs")
+
+    if failures:
+        print(f"{failures} statement(s) scan a whole table or lazy-load while rendering")
+        sys.exit(1)
+    print("All hot-route SELECTs use an index and nothing lazy-loads while rendering")
+
+
+if __name__ == "__main__":
+    main()
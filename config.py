@@ -2,11 +2,115 @@ import os
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+def database_url():
+    url = os.environ.get("DATABASE_URL") or "sqlite:///"+os.path.join(basedir, 'site.db')
+    # Hosting providers often hand out postgres:// URLs, which SQLAlchemy no longer accepts
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+def engine_options(url):
+    if url.startswith("postgresql"):
+        return {
+            "pool_size": int(os.environ.get("DB_POOL_SIZE") or 10),
+            "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW") or 20),
+            "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT") or 30),
+            "pool_pre_ping": True,  # Drop connections the server closed while idle
+            "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE") or 1800),
+        }
+    return {}
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'Some-random-secret-key-that-you-will-never-guess'
-    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or "sqlite:///"+os.path.join(basedir, 'site.db')
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # Disable modification tracking to avoid overhead
+
+    # SQLite pragmas applied to every new connection; the busy timeout makes writers
+    # wait for the lock instead of failing with "database is locked"
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 15000)  # milliseconds
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+
+    # 'raise' or 'warn' when a relationship lazy-loads during template rendering;
+    # defaults to 'warn' in debug mode
+    LAZY_LOAD_GUARD = os.environ.get('LAZY_LOAD_GUARD')
+
+    # Attempts still open ATTEMPT_SWEEP_INTERVAL seconds after their deadline are
+    # auto-submitted in batches of ATTEMPT_SWEEP_BATCH; 0 turns the background sweeper off
+    ATTEMPT_SWEEP_INTERVAL = float(os.environ.get('ATTEMPT_SWEEP_INTERVAL') or 30)
+    ATTEMPT_SWEEP_BATCH = int(os.environ.get('ATTEMPT_SWEEP_BATCH') or 200)
+
+    # Each attempt gets its own question order and option layout, derived from
+    # (user, quiz, attempt) and SECRET_KEY; set to 0 to serve quizzes as authored
+    SHUFFLE_QUESTIONS = os.environ.get('SHUFFLE_QUESTIONS', '1').lower() in ('1', 'true', 'yes')
+    SHUFFLE_OPTIONS = os.environ.get('SHUFFLE_OPTIONS', '1').lower() in ('1', 'true', 'yes')
+
+    # Listings are paged with cursors: PAGE_SIZE rows by default, up to MAX_PAGE_SIZE
+    # with ?per_page=, and their approximate totals are recounted at most every
+    # PAGINATION_COUNT_TTL seconds
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE') or 20)
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE') or 100)
+    PAGINATION_COUNT_TTL = float(os.environ.get('PAGINATION_COUNT_TTL') or 60)
+
+    # Imported questions at least this similar (0-1) to one already in the bank
+    # count as near-duplicates
+    SEARCH_DUPLICATE_THRESHOLD = float(os.environ.get('SEARCH_DUPLICATE_THRESHOLD') or 0.85)
+
+    # Live quiz monitoring: each server-sent event stream holds a server thread, so at
+    # most MONITOR_MAX_WATCHERS run at once and each ends after MONITOR_STREAM_SECONDS
+    # (the browser reconnects)
+    MONITOR_MAX_WATCHERS = int(os.environ.get('MONITOR_MAX_WATCHERS') or 8)
+    MONITOR_STREAM_SECONDS = float(os.environ.get('MONITOR_STREAM_SECONDS') or 300)
+
+    # Instrumentation: requests slower than SLOW_REQUEST_SECONDS are logged with their
+    # slowest SQL statements, and /admin/metrics also accepts "Bearer METRICS_TOKEN"
+    SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS') or 1.0)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Opt-in cProfile sampling; sampled requests above the threshold are dumped to PROFILE_DIR
+    PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '').lower() in ('1', 'true', 'yes')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0.1)
+    PROFILE_THRESHOLD_SECONDS = float(os.environ.get('PROFILE_THRESHOLD_SECONDS') or 0.5)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
+    # Production WSGI server (serve.py)
+    WSGI_HOST = os.environ.get('WSGI_HOST') or '0.0.0.0'
+    WSGI_PORT = int(os.environ.get('WSGI_PORT') or 8000)
+    WSGI_THREADS = int(os.environ.get('WSGI_THREADS') or 16)
     
     # Add the UPLOAD_FOLDER configuration
-    UPLOAD_FOLDER = os.path.join(basedir, 'static', 'images', 'avatars')  # Path for uploaded files
+    UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'images', 'avatars')  # Path for uploaded files, created on first upload
     MAX_CONTENT_LENGTH = 1 * 1024 * 1024  # Limit uploaded files to 1 MB
+
+    # Quiz content cache: in-process LRU budget and optional directory for the shared tier
+    QUIZ_CACHE_MAX_BYTES = int(os.environ.get('QUIZ_CACHE_MAX_BYTES') or 16 * 1024 * 1024)
+    QUIZ_CACHE_SHARED_DIR = os.environ.get('QUIZ_CACHE_SHARED_DIR')
+
+    # Buffered answer writes: flush after this many answers or this many seconds,
+    # and make the submitting request flush when the buffer reaches ANSWER_MAX_PENDING
+    ANSWER_BATCH_SIZE = int(os.environ.get('ANSWER_BATCH_SIZE') or 200)
+    ANSWER_FLUSH_INTERVAL = float(os.environ.get('ANSWER_FLUSH_INTERVAL') or 0.5)
+    ANSWER_MAX_PENDING = int(os.environ.get('ANSWER_MAX_PENDING') or 5000)
+
+    # Question bank uploads are allowed to exceed MAX_CONTENT_LENGTH
+    QUESTION_IMPORT_MAX_BYTES = int(os.environ.get('QUESTION_IMPORT_MAX_BYTES') or 50 * 1024 * 1024)
+
+    # Uploaded avatars are cropped to AVATAR_SIZE pixels square by AVATAR_WORKERS background threads
+    AVATAR_SIZE = int(os.environ.get('AVATAR_SIZE') or 128)
+    AVATAR_WORKERS = int(os.environ.get('AVATAR_WORKERS') or 2)
+
+    # Password hashing parameters in werkzeug's method syntax, e.g. "scrypt:16384:8:1"
+    # or "pbkdf2:sha256:600000". Hashes made with other parameters are upgraded at login.
+    # See benchmarks/bench_passwords.py for the logins per second each setting allows.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1)
+    # Hashes running or queued at once, kept below WSGI_THREADS; unset means half of them
+    PASSWORD_HASH_MAX_IN_FLIGHT = int(os.environ.get('PASSWORD_HASH_MAX_IN_FLIGHT') or 0)
+
+    # current_user snapshots are cached for SESSION_USER_TTL seconds instead of
+    # being reloaded on every request
+    SESSION_USER_TTL = float(os.environ.get('SESSION_USER_TTL') or 60)
+    SESSION_USER_CACHE_MAX_BYTES = int(os.environ.get('SESSION_USER_CACHE_MAX_BYTES') or 4 * 1024 * 1024)
+
+    # Cached quiz analytics reports, recomputed when new answers arrive
+    ANALYTICS_CACHE_MAX_BYTES = int(os.environ.get('ANALYTICS_CACHE_MAX_BYTES') or 32 * 1024 * 1024)
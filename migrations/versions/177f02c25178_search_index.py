@@ -0,0 +1,55 @@
+"""Add the full-text search index over subjects, topics and questions
+
+Revision ID: 177f02c25178
+Revises: 9b970def0d53
+Create Date: 2026-10-18 21:04:12.517340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '177f02c25178'
+down_revision = '9b970def0d53'
+branch_labels = None
+depends_on = None
+
+# Kept in step with app/search.py; the row id is ref_id * 4 + kind
+# (1 subject, 2 topic, 3 question)
+BACKFILL = [
+    "SELECT id * 4 + 1, 1, id, NULL, name, COALESCE(description, '') FROM subject",
+    "SELECT id * 4 + 2, 2, subject_id, NULL, name, COALESCE(description, '') FROM topic",
+    "SELECT quiz_question.id * 4 + 3, 3, quiz.subject_id, quiz_question.quiz_id, quiz_question.question, "
+    "quiz_question.option1 || {nl} || quiz_question.option2 || {nl} || quiz_question.option3 || {nl} || quiz_question.option4 "
+    "FROM quiz_question JOIN quiz ON quiz.id = quiz_question.quiz_id",
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE TABLE search_document ("
+            "id BIGINT PRIMARY KEY, kind SMALLINT NOT NULL, subject_id INTEGER, quiz_id INTEGER, "
+            "title TEXT NOT NULL, body TEXT NOT NULL, "
+            "document TSVECTOR GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')) STORED)"
+        )
+        op.execute("CREATE INDEX ix_search_document_document ON search_document USING GIN (document)")
+        for select in BACKFILL:
+            op.execute("INSERT INTO search_document (id, kind, subject_id, quiz_id, title, body) " + select.format(nl="chr(10)"))
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "title, body, kind UNINDEXED, subject_id UNINDEXED, quiz_id UNINDEXED, "
+            "tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+        for select in BACKFILL:
+            op.execute("INSERT INTO search_index (rowid, kind, subject_id, quiz_id, title, body) " + select.format(nl="char(10)"))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TABLE search_document")
+    else:
+        op.execute("DROP TABLE search_index")
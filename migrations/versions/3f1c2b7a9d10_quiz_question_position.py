@@ -0,0 +1,35 @@
+"""Add quiz_question.position for ordered quiz navigation
+
+Revision ID: 3f1c2b7a9d10
+Revises: 87d89879a9a7
+Create Date: 2026-10-18 09:12:41.218532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2b7a9d10'
+down_revision = '87d89879a9a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('quiz_question', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('position', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_quiz_question_quiz_id_position', ['quiz_id', 'position'], unique=False)
+
+    # Number existing questions within their quiz in id order
+    op.execute(
+        "UPDATE quiz_question SET position = ("
+        "SELECT count(*) FROM quiz_question AS earlier "
+        "WHERE earlier.quiz_id = quiz_question.quiz_id AND earlier.id <= quiz_question.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('quiz_question', schema=None) as batch_op:
+        batch_op.drop_index('ix_quiz_question_quiz_id_position')
+        batch_op.drop_column('position')
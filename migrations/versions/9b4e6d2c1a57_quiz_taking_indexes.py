@@ -0,0 +1,53 @@
+"""Add indexes for the quiz-taking query patterns
+
+Revision ID: 9b4e6d2c1a57
+Revises: 3f1c2b7a9d10
+Create Date: 2026-10-18 14:03:27.584019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4e6d2c1a57'
+down_revision = '3f1c2b7a9d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep only the latest answer per user and question before enforcing uniqueness
+    op.execute(
+        "DELETE FROM quiz_question_user_answers WHERE id NOT IN ("
+        "SELECT max(id) FROM quiz_question_user_answers GROUP BY author_id, question_id)"
+    )
+    with op.batch_alter_table('quiz_question_user_answers', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_quiz_question_user_answers_author_id'))
+        batch_op.create_index('uq_quiz_question_user_answers_author_id_question_id', ['author_id', 'question_id'], unique=True)
+
+    with op.batch_alter_table('quiz', schema=None) as batch_op:
+        batch_op.create_index('ix_quiz_subject_id_status', ['subject_id', 'status'], unique=False)
+
+    with op.batch_alter_table('test_result', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_test_result_quiz_id'), ['quiz_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_test_result_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('topic', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_topic_subject_id'), ['subject_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('topic', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_topic_subject_id'))
+
+    with op.batch_alter_table('test_result', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_test_result_user_id'))
+        batch_op.drop_index(batch_op.f('ix_test_result_quiz_id'))
+
+    with op.batch_alter_table('quiz', schema=None) as batch_op:
+        batch_op.drop_index('ix_quiz_subject_id_status')
+
+    with op.batch_alter_table('quiz_question_user_answers', schema=None) as batch_op:
+        batch_op.drop_index('uq_quiz_question_user_answers_author_id_question_id')
+        batch_op.create_index(batch_op.f('ix_quiz_question_user_answers_author_id'), ['author_id'], unique=False)
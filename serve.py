@@ -0,0 +1,19 @@
+"""Production entry point: serves the app with waitress and a pool of worker threads.
+
+All workers share one process, so the in-process caches and the buffered
+answer writer see every request. Scale out by running one process per host
+behind a load balancer with sticky sessions.
+"""
+from waitress import serve
+from app import create_app
+
+app = create_app()
+
+if __name__ == "__main__":
+    serve(
+        app,
+        host=app.config['WSGI_HOST'],
+        port=app.config['WSGI_PORT'],
+        threads=app.config['WSGI_THREADS'],
+        connection_limit=max(100, app.config['WSGI_THREADS'] * 8),
+    )
@@ -0,0 +1,47 @@
+import pytest
+from app import create_app, db, leaderboard
+from app.quiz_content import quiz_cache
+from app.models import User, Subject, Quiz, QuizQuestion, QuizQuestionAnswer
+from app.enums import QuizStatusEnum, QuestionAnswerEnum
+
+QUESTIONS = 4
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "TESTING": True,
+        "WTF_CSRF_ENABLED": False,
+        "ATTEMPT_SWEEP_INTERVAL": 0,
+        "SHUFFLE_QUESTIONS": False,
+        "SHUFFLE_OPTIONS": False,
+        "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+    })
+    with app.app_context():
+        db.create_all()
+        user = User(username="candidate", email="candidate@example.com", phone="1")
+        user.set_password("password")
+        subject = Subject(name="Physics")
+        db.session.add_all([user, subject])
+        db.session.flush()
+        quiz = Quiz(subject_id=subject.id, status=QuizStatusEnum.FROZEN)
+        db.session.add(quiz)
+        db.session.flush()
+        for i in range(QUESTIONS):
+            question = QuizQuestion(question=f"Question {i}", option1="a", option2="b", option3="c", option4="d",
+                                    position=i + 1, quiz_id=quiz.id)
+            question.answer = QuizQuestionAnswer(option=QuestionAnswerEnum(1))
+            db.session.add(question)
+        db.session.commit()
+        # In-process caches outlive each test's database
+        quiz_cache.local.clear()
+        leaderboard.rebuild_all()
+    yield app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post("/login", data={"username": "candidate", "password": "password"})
+    return client
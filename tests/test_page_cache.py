@@ -0,0 +1,17 @@
+from app import db
+from app import page_cache
+from app.models import Quiz
+
+
+def test_versions_move_on_commit_only(app):
+    with app.app_context():
+        before = page_cache.version(("quiz", 1))
+        db.session.get(Quiz, 1).sample_size = 2
+        db.session.flush()
+        assert page_cache.version(("quiz", 1)) == before
+        db.session.rollback()
+        assert page_cache.version(("quiz", 1)) == before
+
+        db.session.get(Quiz, 1).sample_size = 2
+        db.session.commit()
+        assert page_cache.version(("quiz", 1)) != before
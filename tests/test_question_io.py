@@ -0,0 +1,36 @@
+import io
+import pytest
+import sqlalchemy as sa
+from app import db
+from app.models import Subject, Topic, QuizQuestion
+from app.question_io import import_questions, QuestionImportError
+
+HEADER = "question,option1,option2,option3,option4,answer,topic_id\n"
+
+
+def question_count():
+    return db.session.scalar(sa.select(sa.func.count(QuizQuestion.id)))
+
+
+def test_topic_of_another_subject_is_rejected(app):
+    with app.app_context():
+        other = Subject(name="Chemistry")
+        db.session.add(other)
+        db.session.flush()
+        topic = Topic(name="Acids", subject_id=other.id)
+        db.session.add(topic)
+        db.session.commit()
+        before = question_count()
+
+        for topic_id in (topic.id, 999):
+            stream = io.StringIO(HEADER + f"Q,a,b,c,d,1,{topic_id}\n")
+            with pytest.raises(QuestionImportError, match="Line 2: topic"):
+                import_questions(1, stream, "csv")
+        assert question_count() == before
+
+
+def test_malformed_csv_is_an_import_error(app):
+    with app.app_context():
+        stream = io.StringIO(HEADER + "Q," + "x" * 200_000 + ",b,c,d,1,\n")
+        with pytest.raises(QuestionImportError, match="malformed CSV"):
+            import_questions(1, stream, "csv")
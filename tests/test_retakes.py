@@ -0,0 +1,51 @@
+import sqlalchemy as sa
+from app import db
+from app import models
+from app import leaderboard
+from conftest import QUESTIONS
+
+
+def take_quiz(client, answer):
+    # Answer every question of quiz 1 with the given option, then submit
+    location = client.get("/subjects/1/tests/1/start").headers["Location"]
+    while location:
+        client.get(location)
+        next_location = client.post(location, data={"answer": answer}).headers["Location"]
+        location = client.get(next_location).headers.get("Location")
+    return submit(client)
+
+
+def submit(client):
+    response = client.post("/submit_quiz/1")
+    assert response.status_code == 302
+    result_id = int(response.headers["Location"].rsplit("/", 1)[-1])
+    return db.session.get(models.TestResult, result_id)
+
+
+def test_retake_without_answers_scores_zero(app, client):
+    with app.app_context():
+        first = take_quiz(client, "1")
+        assert first.score == QUESTIONS
+
+        # Start a retake and submit it straight away
+        client.get("/subjects/1/tests/1/start")
+        retake = submit(client)
+        assert retake.id != first.id
+        assert retake.score == 0
+        assert db.session.scalar(sa.select(sa.func.count(models.TestResult.id))) == 2
+
+
+def test_hollow_retake_keeps_leaderboard_entry(app, client):
+    with app.app_context():
+        first = take_quiz(client, "1")
+        for kind, board_id in (("quiz", 1), ("subject", 1)):
+            top, rank, _ = leaderboard.standings(kind, board_id, user_id=first.user_id)
+            assert rank == 1 and top[0][2:] == (QUESTIONS, first.time_taken)
+
+        # A retake with no answers of its own scores 0 and can't replace the real entry
+        client.get("/subjects/1/tests/1/start")
+        retake = submit(client)
+        assert retake.score == 0
+        for kind, board_id in (("quiz", 1), ("subject", 1)):
+            top, rank, count = leaderboard.standings(kind, board_id, user_id=first.user_id)
+            assert count == 1 and top[0][2:] == (QUESTIONS, first.time_taken)